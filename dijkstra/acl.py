@@ -0,0 +1,334 @@
+import sys
+
+from dataclasses import dataclass
+from collections.abc import Iterable
+
+from subnets_and_masks.netfuncs import (
+    SUBNET_MASK_VALUES,
+    as_ipv4_values,
+    get_network,
+    ipv4_to_value,
+    parse_options,
+)
+
+
+ANY = "any"
+
+PROTOCOLS = {"icmp": 1, "tcp": 6, "udp": 17}
+
+ALL_PORTS = (0, 65535)
+
+DEFAULT_ACTION = "deny"
+
+# A flow: (src address value, dst address value, protocol, src port, dst port)
+Flow = tuple[int, int, int, int, int]
+
+
+@dataclass
+class AclRule:
+    """
+    One ACL line. Networks are already masked values, a protocol of None
+    matches any protocol and port ranges are inclusive.
+    """
+
+    action: str
+    protocol: int | None
+    src_network: int
+    src_length: int
+    src_ports: tuple[int, int]
+    dst_network: int
+    dst_length: int
+    dst_ports: tuple[int, int]
+
+    def matches(self, flow: Flow) -> bool:
+        """
+        Plain check of one flow against this rule, as a linear scan
+        would do it.
+        """
+        src, dst, protocol, src_port, dst_port = flow
+        return (
+            src & SUBNET_MASK_VALUES[self.src_length] == self.src_network
+            and dst & SUBNET_MASK_VALUES[self.dst_length] == self.dst_network
+            and (self.protocol is None or self.protocol == protocol)
+            and self.src_ports[0] <= src_port <= self.src_ports[1]
+            and self.dst_ports[0] <= dst_port <= self.dst_ports[1]
+        )
+
+
+def parse_cidr(cidr: str) -> tuple[int, int]:
+    """
+    "10.0.0.0/8" -> (network value, 8); "any" -> (0, 0); a bare address
+    is a /32.
+    """
+    if cidr == ANY:
+        return 0, 0
+
+    ip, _, slash = cidr.partition("/")
+    length = int(slash) if slash else 32
+    if length < 0 or length > 32:
+        raise ValueError("Invalid subnet mask")
+
+    return get_network(ipv4_to_value(ip), SUBNET_MASK_VALUES[length]), length
+
+
+def parse_ports(ports: str) -> tuple[int, int]:
+    """
+    "443" -> (443, 443); "1024-65535" -> (1024, 65535); "any" -> all.
+    """
+    if ports == ANY:
+        return ALL_PORTS
+
+    low, _, high = ports.partition("-")
+    low, high = int(low), int(high or low)
+    if not 0 <= low <= high <= 65535:
+        raise ValueError(f"Invalid port range {ports}")
+
+    return low, high
+
+
+def parse_protocol(protocol: str) -> int | None:
+    if protocol == ANY:
+        return None
+    return PROTOCOLS.get(protocol.lower()) or int(protocol)
+
+
+def parse_rule(line: str) -> AclRule:
+    """
+    Parse one rule of the form
+
+        <action> <protocol> <src cidr> <src ports> <dst cidr> <dst ports>
+
+    e.g. "permit tcp 10.0.0.0/8 any 192.168.1.0/24 443". Any field but
+    the action can be "any".
+    """
+    try:
+        action, protocol, src, src_ports, dst, dst_ports = line.split()
+    except ValueError:
+        raise ValueError(f"Invalid ACL rule: {line!r}")
+
+    src_network, src_length = parse_cidr(src)
+    dst_network, dst_length = parse_cidr(dst)
+
+    return AclRule(
+        action,
+        parse_protocol(protocol),
+        src_network,
+        src_length,
+        parse_ports(src_ports),
+        dst_network,
+        dst_length,
+        parse_ports(dst_ports),
+    )
+
+
+def parse_flow(line: str) -> Flow:
+    """
+    "<protocol> <src ip> <src port> <dst ip> <dst port>" -> Flow
+    """
+    protocol, src, src_port, dst, dst_port = line.split()
+    return (
+        ipv4_to_value(src),
+        ipv4_to_value(dst),
+        parse_protocol(protocol),
+        int(src_port),
+        int(dst_port),
+    )
+
+
+class AclClassifier:
+    """
+    First-match classifier over an ordered rule list, using tuple space
+    search.
+
+    Rules are grouped into tuples by the shape of what they match
+    exactly: (src prefix length, dst prefix length, protocol given,
+    single dst port). Within a tuple every rule reduces to one hash key
+    (masked src, masked dst, protocol, dst port), so a flow needs one
+    dict probe per tuple instead of one comparison per rule. Source
+    ports and dst port ranges are checked on the few rules left in the
+    bucket.
+
+    Tuples are probed in order of the first rule they hold, and probing
+    stops as soon as the next tuple cannot hold a rule earlier than the
+    best match so far. A rule set has a few dozen tuples even when it
+    has tens of thousands of rules.
+    """
+
+    def __init__(
+        self, rules: Iterable[AclRule | str], default_action: str = DEFAULT_ACTION
+    ):
+        self.rules: list[AclRule] = [
+            parse_rule(rule) if isinstance(rule, str) else rule for rule in rules
+        ]
+        self.default_action = default_action
+
+        tuples: dict[tuple, dict[tuple, list[int]]] = {}
+
+        for index, rule in enumerate(self.rules):
+            exact_port = rule.dst_ports[0] == rule.dst_ports[1]
+            shape = (
+                rule.src_length,
+                rule.dst_length,
+                rule.protocol is not None,
+                exact_port,
+            )
+
+            key = (
+                rule.src_network,
+                rule.dst_network,
+                rule.protocol,
+                rule.dst_ports[0] if exact_port else None,
+            )
+            tuples.setdefault(shape, {}).setdefault(key, []).append(index)
+
+        # (first rule index, src mask, dst mask, protocol given, exact dst
+        # port, buckets), in first rule order
+        self.tuples = sorted(
+            (
+                min(bucket[0] for bucket in buckets.values()),
+                SUBNET_MASK_VALUES[src_length],
+                SUBNET_MASK_VALUES[dst_length],
+                has_protocol,
+                exact_port,
+                buckets,
+            )
+            for (src_length, dst_length, has_protocol, exact_port), buckets in (
+                tuples.items()
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, flow: Flow) -> int | None:
+        """
+        Index of the first rule that matches the flow, or None.
+        """
+        src, dst, protocol, src_port, dst_port = flow
+        best = len(self.rules)
+
+        for first_index, src_mask, dst_mask, has_protocol, exact_port, buckets in (
+            self.tuples
+        ):
+            if first_index >= best:
+                break
+
+            bucket = buckets.get(
+                (
+                    src & src_mask,
+                    dst & dst_mask,
+                    protocol if has_protocol else None,
+                    dst_port if exact_port else None,
+                )
+            )
+            if bucket is None:
+                continue
+
+            for index in bucket:
+                if index >= best:
+                    break
+
+                rule = self.rules[index]
+                if (
+                    rule.src_ports[0] <= src_port <= rule.src_ports[1]
+                    and rule.dst_ports[0] <= dst_port <= rule.dst_ports[1]
+                ):
+                    best = index
+                    break
+
+        return best if best < len(self.rules) else None
+
+    def classify(self, flow: Flow) -> str:
+        index = self.match(flow)
+        return self.default_action if index is None else self.rules[index].action
+
+    def classify_batch(self, flows: Iterable) -> list[str]:
+        """
+        Action for every flow, in order. Flows can carry dots-and-numbers
+        strings or values for the addresses; the addresses are converted
+        in bulk, and a flow seen earlier in the batch is answered from a
+        per-batch cache, as traffic repeats the same few flows a lot.
+        """
+        flows = list(flows)
+        srcs = as_ipv4_values([flow[0] for flow in flows])
+        dsts = as_ipv4_values([flow[1] for flow in flows])
+
+        actions: dict[Flow, str] = {}
+        results = []
+
+        for src, dst, (_, _, protocol, src_port, dst_port) in zip(srcs, dsts, flows):
+            flow = (src, dst, protocol, src_port, dst_port)
+
+            action = actions.get(flow)
+            if action is None:
+                action = actions[flow] = self.classify(flow)
+
+            results.append(action)
+
+        return results
+
+
+def linear_classify(
+    rules: list[AclRule], flow: Flow, default_action: str = DEFAULT_ACTION
+) -> str:
+    """
+    Reference first-match classification: check every rule in order.
+    """
+    for rule in rules:
+        if rule.matches(flow):
+            return rule.action
+
+    return default_action
+
+
+def read_lines(file_name: str) -> list[str]:
+    """
+    Non-blank lines of a file, without "#" comments.
+    """
+    with open(file_name) as fp:
+        lines = (line.split("#")[0].strip() for line in fp)
+        return [line for line in lines if line]
+
+
+def usage():
+    print(
+        "usage: acl.py rules.txt flows.txt [--default=deny] [--verbose]",
+        file=sys.stderr,
+    )
+
+
+def main(argv):
+    positional, options = parse_options(argv)
+
+    try:
+        rules_file_name = positional[1]
+        flows_file_name = positional[2]
+        classifier = AclClassifier(
+            read_lines(rules_file_name), options.get("default", DEFAULT_ACTION)
+        )
+        flow_lines = read_lines(flows_file_name)
+        flows = [parse_flow(line) for line in flow_lines]
+    except (IndexError, ValueError, KeyError):
+        usage()
+        return 1
+
+    actions = classifier.classify_batch(flows)
+
+    if "verbose" in options:
+        for line, action in zip(flow_lines, actions):
+            print(f"{action:<8s} {line}")
+        return 0
+
+    counts: dict[str, int] = {}
+    for action in actions:
+        counts[action] = counts.get(action, 0) + 1
+
+    print("Actions and flow counts:")
+    for action in sorted(counts.keys()):
+        print(f" {action:>8s}: {counts[action]}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,192 @@
+import io
+import sys
+import json
+import time
+import platform
+
+from contextlib import redirect_stdout
+
+from dijkstra import (
+    DEFAULT_ENGINE,
+    ENGINE_NAMES,
+    dijkstras_shortest_path,
+    find_routes,
+    parse_options,
+    parse_routers,
+)
+from generate_topology import generate_topology
+from subnets_and_masks.netfuncs import PrefixIndex, find_router_for_ip
+
+
+DEFAULT_SIZES = (100, 1000, 5000)
+DEFAULT_REPEAT = 3
+DEFAULT_PAIRS = 200
+DEFAULT_SEED = 1
+
+# A metric counts as a regression when it gets this much slower than
+# the baseline.
+DEFAULT_THRESHOLD = 1.25
+
+
+def best_time(function, repeat: int) -> float:
+    """
+    Run function `repeat` times and return the fastest wall time, which
+    is the least noisy estimate of its cost.
+    """
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def benchmark_size(
+    router_count: int,
+    engines: list[str],
+    repeat: int = DEFAULT_REPEAT,
+    pair_count: int = DEFAULT_PAIRS,
+    seed: int = DEFAULT_SEED,
+) -> dict[str, float]:
+    """
+    Time the routing pipeline on one generated topology. Every metric is
+    in seconds: parse_routers for the whole topology, the others per
+    call (per IP or per pair).
+    """
+    topology = generate_topology(router_count, pair_count=pair_count, seed=seed)
+    routers = topology["routers"]
+    pairs = topology["src-dest"]
+    ips = [ip for pair in pairs for ip in pair]
+
+    def lookup_all():
+        for ip in ips:
+            find_router_for_ip(routers, ip)
+
+    prefix_index = PrefixIndex(routers)
+
+    def index_lookup_all():
+        for ip in ips:
+            prefix_index.find_router(ip)
+
+    metrics = {
+        "parse_routers": best_time(lambda: parse_routers(routers), repeat),
+        "find_router_for_ip": best_time(lookup_all, repeat) / len(ips),
+        "PrefixIndex": best_time(lambda: PrefixIndex(routers), repeat),
+        "PrefixIndex.find_router": best_time(index_lookup_all, repeat) / len(ips),
+    }
+
+    for engine in engines:
+
+        def shortest_paths():
+            for src_ip, dest_ip in pairs:
+                dijkstras_shortest_path(routers, src_ip, dest_ip, engine)
+
+        def routes():
+            with redirect_stdout(io.StringIO()):
+                find_routes(routers, pairs, engine)
+
+        metrics[f"dijkstras_shortest_path[{engine}]"] = (
+            best_time(shortest_paths, repeat) / len(pairs)
+        )
+        metrics[f"find_routes[{engine}]"] = best_time(routes, repeat) / len(pairs)
+
+    return metrics
+
+
+def run_benchmarks(
+    sizes: list[int], engines: list[str], repeat: int = DEFAULT_REPEAT
+) -> dict:
+    results = {}
+
+    for size in sizes:
+        results[str(size)] = benchmark_size(size, engines, repeat)
+
+        for metric, seconds in results[str(size)].items():
+            print(f"{size:>8d} {metric:<40s} {seconds * 1000:12.4f} ms")
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def find_regressions(
+    report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[str]:
+    """
+    Compare a report with a saved baseline and describe every metric
+    that got more than `threshold` times slower. Metrics missing from
+    either side are ignored.
+    """
+    regressions = []
+
+    for size, metrics in report["results"].items():
+        baseline_metrics = baseline["results"].get(size, {})
+
+        for metric, seconds in metrics.items():
+            baseline_seconds = baseline_metrics.get(metric)
+            if baseline_seconds is None or baseline_seconds <= 0:
+                continue
+
+            ratio = seconds / baseline_seconds
+            if ratio > threshold:
+                regressions.append(
+                    f"{size} {metric}: {seconds * 1000:.4f} ms, "
+                    f"{ratio:.2f}x the baseline {baseline_seconds * 1000:.4f} ms"
+                )
+
+    return regressions
+
+
+def usage():
+    print(
+        "usage: benchmark.py [--sizes=100,1000,5000] "
+        f"[--engines={','.join(ENGINE_NAMES)}] [--repeat=N] "
+        "[--save=baseline.json] [--baseline=baseline.json] [--threshold=1.25]",
+        file=sys.stderr,
+    )
+
+
+def main(argv):
+    _, options = parse_options(argv)
+
+    try:
+        sizes = list(DEFAULT_SIZES)
+        if "sizes" in options:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        engines = options.get("engines", DEFAULT_ENGINE).split(",")
+        repeat = int(options.get("repeat", DEFAULT_REPEAT))
+        threshold = float(options.get("threshold", DEFAULT_THRESHOLD))
+    except ValueError:
+        usage()
+        return 1
+
+    if any(engine not in ENGINE_NAMES for engine in engines):
+        usage()
+        return 1
+
+    report = run_benchmarks(sizes, engines, repeat)
+
+    if "save" in options:
+        with open(options["save"], "w") as fp:
+            json.dump(report, fp, indent=4)
+
+    if "baseline" in options:
+        with open(options["baseline"]) as fp:
+            baseline = json.load(fp)
+
+        regressions = find_regressions(report, baseline, threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+        if len(regressions) > 0:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
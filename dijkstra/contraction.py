@@ -0,0 +1,471 @@
+import json
+import math
+import heapq
+
+from dataclasses import dataclass, field
+
+
+Node = str
+NodeId = int
+
+Graph = dict[Node, set[tuple[Node, int]]]
+
+# Edges with no middle node are original router connections.
+NO_MIDDLE = -1
+
+# Witness searches give up after settling this many nodes, or on paths
+# of more than this many edges. A failed witness search only costs an
+# unneeded shortcut, never a wrong answer, but unneeded shortcuts pile
+# up: every one adds edges to the nodes contracted after it.
+WITNESS_SETTLE_LIMIT = 1000
+WITNESS_HOP_LIMIT = 8
+
+# Estimating a node's priority only needs its shortcut count roughly,
+# so those witness searches get a smaller budget.
+PRIORITY_SETTLE_LIMIT = 100
+
+# Weights of the priority terms: edge difference, contracted neighbours
+# and level (how many contractions deep the node's neighbourhood is).
+EDGE_DIFFERENCE_WEIGHT = 1
+CONTRACTED_NEIGHBORS_WEIGHT = 1
+LEVEL_WEIGHT = 1
+
+# Contraction stops once the nodes left have this many edges each on
+# average. Contracting a dense core only trades its edges for even more
+# shortcuts, so it is left as it is and searched by bidirectional
+# Dijkstra.
+CORE_DEGREE_LIMIT = 8
+
+
+@dataclass
+class ContractionHierarchy:
+    """
+    A router graph preprocessed for fast point-to-point queries.
+
+    Every node has a rank (its contraction order). `up_edges[u]` holds
+    the edges u -> w with rank[w] > rank[u]; `down_edges[w]` holds the
+    edges u -> w with rank[u] > rank[w], stored at w so the backward
+    search can walk them upwards too. `middles[(u, w)]` is the node a
+    shortcut u -> w skips over, used to unpack it into router hops.
+
+    Nodes ranked core_rank or higher form the core, the part of the
+    graph that was never contracted. An edge between two core nodes is
+    stored in both directions, so the searches can move freely inside
+    the core.
+    """
+
+    names: list[Node]
+    rank: list[int]
+    up_edges: list[list[tuple[NodeId, int]]] = field(default_factory=list)
+    down_edges: list[list[tuple[NodeId, int]]] = field(default_factory=list)
+    middles: dict[tuple[NodeId, NodeId], NodeId] = field(default_factory=dict)
+    core_rank: int | None = None
+
+    def __post_init__(self):
+        self.ids = {name: node for node, name in enumerate(self.names)}
+
+    @property
+    def shortcut_count(self) -> int:
+        return len(self.middles)
+
+    @property
+    def core_size(self) -> int:
+        if self.core_rank is None:
+            return 0
+        return len(self.rank) - self.core_rank
+
+    def in_core(self, tail: NodeId, head: NodeId) -> bool:
+        if self.core_rank is None:
+            return False
+        return min(self.rank[tail], self.rank[head]) >= self.core_rank
+
+    def add_edge(self, tail: NodeId, head: NodeId, weight: int, middle: NodeId):
+        if self.in_core(tail, head):
+            self.up_edges[tail].append((head, weight))
+            self.down_edges[head].append((tail, weight))
+        elif self.rank[head] > self.rank[tail]:
+            self.up_edges[tail].append((head, weight))
+        else:
+            self.down_edges[head].append((tail, weight))
+
+        if middle != NO_MIDDLE:
+            self.middles[(tail, head)] = middle
+
+    def search(
+        self, source: NodeId, destination: NodeId
+    ) -> tuple[float, NodeId, dict[NodeId, NodeId], dict[NodeId, NodeId]]:
+        """
+        Bidirectional upward Dijkstra. Returns the distance, the meeting
+        node and the forward/backward parent maps.
+
+        With a core, the upward searches stop at the core nodes they
+        reach, and a bidirectional Dijkstra seeded with those nodes
+        finishes the search inside the core.
+        """
+        graphs = (self.up_edges, self.down_edges)
+        distances = ({source: 0}, {destination: 0})
+        parents = ({source: None}, {destination: None})
+        heaps = ([(0, source)], [(0, destination)])
+        core_rank = len(self.rank) if self.core_rank is None else self.core_rank
+
+        best_distance = math.inf
+        meeting_node = None
+
+        while len(heaps[0]) > 0 or len(heaps[1]) > 0:
+            for side in (0, 1):
+                heap = heaps[side]
+                if len(heap) == 0:
+                    continue
+
+                distance, closest_node = heapq.heappop(heap)
+                if distance > distances[side][closest_node]:
+                    continue
+
+                # nothing left on this side can beat the best path
+                if distance >= best_distance:
+                    heap.clear()
+                    continue
+
+                other_distance = distances[1 - side].get(closest_node)
+                if other_distance is not None:
+                    if distance + other_distance < best_distance:
+                        best_distance = distance + other_distance
+                        meeting_node = closest_node
+
+                if self.rank[closest_node] >= core_rank:
+                    continue
+
+                for neighbor, neighbor_weight in graphs[side][closest_node]:
+                    total_distance = distance + neighbor_weight
+                    if total_distance < distances[side].get(neighbor, math.inf):
+                        distances[side][neighbor] = total_distance
+                        parents[side][neighbor] = closest_node
+                        heapq.heappush(heap, (total_distance, neighbor))
+
+        if self.core_rank is None:
+            return best_distance, meeting_node, parents[0], parents[1]
+
+        for side in (0, 1):
+            heaps[side].extend(
+                (distance, node)
+                for node, distance in distances[side].items()
+                if self.rank[node] >= core_rank and distance < best_distance
+            )
+            heapq.heapify(heaps[side])
+
+        # in the core: plain bidirectional Dijkstra, which can stop once
+        # the two heap minimums add up to the best path
+        while len(heaps[0]) > 0 and len(heaps[1]) > 0:
+            if heaps[0][0][0] + heaps[1][0][0] >= best_distance:
+                break
+
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            distance, closest_node = heapq.heappop(heaps[side])
+            if distance > distances[side][closest_node]:
+                continue
+
+            for neighbor, neighbor_weight in graphs[side][closest_node]:
+                total_distance = distance + neighbor_weight
+                if total_distance < distances[side].get(neighbor, math.inf):
+                    distances[side][neighbor] = total_distance
+                    parents[side][neighbor] = closest_node
+                    heapq.heappush(heaps[side], (total_distance, neighbor))
+
+                other_distance = distances[1 - side].get(neighbor)
+                if other_distance is not None:
+                    candidate = distances[side][neighbor] + other_distance
+                    if candidate < best_distance:
+                        best_distance = candidate
+                        meeting_node = neighbor
+
+        return best_distance, meeting_node, parents[0], parents[1]
+
+    def unpack(self, tail: NodeId, head: NodeId) -> list[NodeId]:
+        """
+        Expand the edge tail -> head into the original hops it stands
+        for. The result excludes tail and ends with head.
+        """
+        hops: list[NodeId] = []
+        stack = [(tail, head)]
+
+        while len(stack) > 0:
+            edge = stack.pop()
+            middle = self.middles.get(edge)
+
+            if middle is None:
+                hops.append(edge[1])
+            else:
+                stack.append((middle, edge[1]))
+                stack.append((edge[0], middle))
+
+        return hops
+
+    def shortest_path(self, source_node: Node, destination_node: Node) -> list[Node]:
+        """
+        A shortest path like the Dijkstra engines return, though not
+        necessarily the same one when several are equally short: the
+        node names from source to destination, or [destination_node] if
+        it cannot be reached.
+        """
+        source = self.ids[source_node]
+        destination = self.ids[destination_node]
+
+        _, meeting_node, forward, backward = self.search(source, destination)
+        if meeting_node is None:
+            return [destination_node]
+
+        # hierarchy nodes: source ... meeting_node ... destination
+        path: list[NodeId] = []
+        current_node = meeting_node
+        while current_node is not None:
+            path.append(current_node)
+            current_node = forward[current_node]
+        path.reverse()
+
+        current_node = backward[meeting_node]
+        while current_node is not None:
+            path.append(current_node)
+            current_node = backward[current_node]
+
+        hops = [source]
+        for tail, head in zip(path, path[1:]):
+            hops.extend(self.unpack(tail, head))
+
+        return [self.names[node] for node in hops]
+
+
+def build_contraction_hierarchy(graph: Graph) -> ContractionHierarchy:
+    """
+    Contract the nodes of a parse_routers graph one at a time, cheapest
+    first by a weighted sum of edge difference (shortcuts added minus
+    edges removed), the number of already contracted neighbours and the
+    node's level, with lazy priority updates. The last two spread the
+    contractions evenly over the graph, which keeps the hierarchy flat
+    and the upward searches small.
+
+    A shortcut u -> w is only added when a witness search from u that
+    avoids the contracted node finds no path at least as short. Once the
+    nodes left average CORE_DEGREE_LIMIT edges they are ranked in queue
+    order without being contracted and become the core.
+    """
+    names = list(graph.keys())
+    ids = {name: node for node, name in enumerate(names)}
+    node_count = len(names)
+
+    out_edges: list[dict[NodeId, int]] = [{} for _ in range(node_count)]
+    in_edges: list[dict[NodeId, int]] = [{} for _ in range(node_count)]
+    middles: dict[tuple[NodeId, NodeId], NodeId] = {}
+
+    for name, neighbors in graph.items():
+        for neighbor, neighbor_weight in neighbors:
+            if neighbor not in ids or neighbor == name:
+                continue
+
+            tail, head = ids[name], ids[neighbor]
+            if neighbor_weight < out_edges[tail].get(head, math.inf):
+                out_edges[tail][head] = neighbor_weight
+                in_edges[head][tail] = neighbor_weight
+
+    contracted = bytearray(node_count)
+    contracted_neighbors = [0] * node_count
+    level = [0] * node_count
+
+    # edges between nodes not contracted yet
+    edge_count = sum(len(heads) for heads in out_edges)
+
+    def witness_search(
+        source: NodeId, excluded: NodeId, limit: int, targets, settle_limit: int
+    ):
+        """
+        Distances from source avoiding excluded, up to limit. Stops once
+        every target is settled, or after settle_limit nodes; a path
+        found through WITNESS_HOP_LIMIT edges is not followed on.
+        """
+        distances = {source: 0}
+        hops = {source: 0}
+        heap = [(0, source)]
+        settled = 0
+        remaining = len(targets)
+
+        while len(heap) > 0 and settled < settle_limit:
+            distance, closest_node = heapq.heappop(heap)
+            if distance > distances[closest_node]:
+                continue
+            if distance > limit:
+                break
+            settled += 1
+
+            if closest_node in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+
+            if hops[closest_node] == WITNESS_HOP_LIMIT:
+                continue
+
+            for neighbor, neighbor_weight in out_edges[closest_node].items():
+                if neighbor == excluded or contracted[neighbor]:
+                    continue
+
+                total_distance = distance + neighbor_weight
+                if total_distance < distances.get(neighbor, math.inf):
+                    distances[neighbor] = total_distance
+                    hops[neighbor] = hops[closest_node] + 1
+                    heapq.heappush(heap, (total_distance, neighbor))
+
+        return distances
+
+    def shortcuts_for(
+        node: NodeId, settle_limit: int = WITNESS_SETTLE_LIMIT
+    ) -> list[tuple[NodeId, NodeId, int]]:
+        incoming = [
+            (tail, weight)
+            for tail, weight in in_edges[node].items()
+            if not contracted[tail]
+        ]
+        outgoing = [
+            (head, weight)
+            for head, weight in out_edges[node].items()
+            if not contracted[head]
+        ]
+
+        shortcuts = []
+        if len(outgoing) == 0:
+            return shortcuts
+
+        longest_out = max(weight for _, weight in outgoing)
+        heads = {head for head, _ in outgoing}
+
+        for tail, in_weight in incoming:
+            witness = witness_search(
+                tail, node, in_weight + longest_out, heads, settle_limit
+            )
+
+            for head, out_weight in outgoing:
+                if head == tail:
+                    continue
+
+                via_distance = in_weight + out_weight
+                if witness.get(head, math.inf) > via_distance and (
+                    via_distance < out_edges[tail].get(head, math.inf)
+                ):
+                    shortcuts.append((tail, head, via_distance))
+
+        return shortcuts
+
+    def priority(node: NodeId, shortcuts: list) -> int:
+        degree = sum(not contracted[tail] for tail in in_edges[node]) + sum(
+            not contracted[head] for head in out_edges[node]
+        )
+        return (
+            EDGE_DIFFERENCE_WEIGHT * (len(shortcuts) - degree)
+            + CONTRACTED_NEIGHBORS_WEIGHT * contracted_neighbors[node]
+            + LEVEL_WEIGHT * level[node]
+        )
+
+    def estimate(node: NodeId) -> int:
+        return priority(node, shortcuts_for(node, PRIORITY_SETTLE_LIMIT))
+
+    queue = [(estimate(node), node) for node in range(node_count)]
+    heapq.heapify(queue)
+
+    rank = [0] * node_count
+    order = 0
+    core_rank = None
+
+    while len(queue) > 0:
+        if edge_count > CORE_DEGREE_LIMIT * len(queue):
+            core_rank = order
+            for _, node in sorted(queue):
+                rank[node] = order
+                order += 1
+            break
+
+        _, node = heapq.heappop(queue)
+
+        # lazy update: re-evaluate, and put it back if it got worse than
+        # the next candidate
+        node_priority = estimate(node)
+        if len(queue) > 0 and node_priority > queue[0][0]:
+            heapq.heappush(queue, (node_priority, node))
+            continue
+
+        shortcuts = shortcuts_for(node)
+        for tail, head, weight in shortcuts:
+            if head not in out_edges[tail]:
+                edge_count += 1
+            out_edges[tail][head] = weight
+            in_edges[head][tail] = weight
+            middles[(tail, head)] = node
+
+        contracted[node] = 1
+        edge_count -= sum(not contracted[tail] for tail in in_edges[node])
+        edge_count -= sum(not contracted[head] for head in out_edges[node])
+        rank[node] = order
+        order += 1
+
+        for neighbor in in_edges[node].keys() | out_edges[node].keys():
+            if not contracted[neighbor]:
+                contracted_neighbors[neighbor] += 1
+                level[neighbor] = max(level[neighbor], level[node] + 1)
+
+    hierarchy = ContractionHierarchy(
+        names,
+        rank,
+        [[] for _ in range(node_count)],
+        [[] for _ in range(node_count)],
+        core_rank=core_rank,
+    )
+
+    for tail in range(node_count):
+        for head, weight in out_edges[tail].items():
+            middle = middles.get((tail, head), NO_MIDDLE)
+            hierarchy.add_edge(tail, head, weight, middle)
+
+    return hierarchy
+
+
+def save_contraction_hierarchy(hierarchy: ContractionHierarchy, file_name: str):
+    edges = []
+
+    for tail, neighbors in enumerate(hierarchy.up_edges):
+        for head, weight in neighbors:
+            edges.append([tail, head, weight])
+    for head, neighbors in enumerate(hierarchy.down_edges):
+        for tail, weight in neighbors:
+            # core edges are in up_edges as well
+            if not hierarchy.in_core(tail, head):
+                edges.append([tail, head, weight])
+
+    for edge in edges:
+        edge.append(hierarchy.middles.get((edge[0], edge[1]), NO_MIDDLE))
+
+    with open(file_name, "w") as fp:
+        json.dump(
+            {
+                "nodes": hierarchy.names,
+                "rank": hierarchy.rank,
+                "core_rank": hierarchy.core_rank,
+                "edges": edges,
+            },
+            fp,
+        )
+
+
+def load_contraction_hierarchy(file_name: str) -> ContractionHierarchy:
+    with open(file_name) as fp:
+        data = json.load(fp)
+
+    node_count = len(data["nodes"])
+    hierarchy = ContractionHierarchy(
+        data["nodes"],
+        data["rank"],
+        [[] for _ in range(node_count)],
+        [[] for _ in range(node_count)],
+        core_rank=data.get("core_rank"),
+    )
+
+    for tail, head, weight, middle in data["edges"]:
+        hierarchy.add_edge(tail, head, weight, middle)
+
+    return hierarchy
@@ -1,9 +1,39 @@
 import sys
 import json
 import math  # If you want to use math.inf for infinity
-
-from dataclasses import dataclass
-from subnets_and_masks.netfuncs import find_router_for_ip
+import time
+import heapq
+
+from array import array
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from dataclasses import asdict, dataclass
+from subnets_and_masks.netfuncs import (
+    RouterTable,
+    parse_options,
+    stream_topology,
+)
+from contraction import (
+    ContractionHierarchy,
+    build_contraction_hierarchy,
+    load_contraction_hierarchy,
+    save_contraction_hierarchy,
+)
+from parallel_routes import OUTPUT_FORMATS, parallel_find_routes
+from routing_table import (
+    RoutingTable,
+    build_routing_table,
+    load_routing_table,
+    save_routing_table,
+)
+from topology import (
+    CompiledTopology,
+    TopologyBuilder,
+    compile_topology,
+    csr_search,
+    reconstruct_csr_path,
+)
 
 
 Node = str
@@ -32,6 +62,77 @@ class NetworkInfo:
 
 Routers = dict[str, NetworkInfo]
 
+DEFAULT_ENGINE = "heap"
+# Runs on a CompiledTopology (see topology.py) instead of a Graph.
+CSR_ENGINE = "csr"
+# The most shortest-path trees a RoutingContext caches by default. Fewer
+# are kept when that many would not fit in TREE_CACHE_MEMORY_BUDGET.
+DEFAULT_TREE_CACHE_SIZE = 1024
+TREE_CACHE_MEMORY_BUDGET = 256 << 20
+
+# About what one node costs in a cached tree: a parent dict entry (heap)
+# or one array("l") slot (csr).
+TREE_BYTES_PER_NODE = {"heap": 40, CSR_ENGINE: 8}
+
+
+@dataclass
+class RouteStats:
+    """
+    Where the time of a route query went. Times are wall seconds per
+    stage: parse (parse_routers / compile_topology), resolve (endpoint
+    IPs to graph nodes), search and reconstruct. The counters come from
+    the search loop; a query answered from a cached tree settles nothing.
+
+    One object per query, or one for a whole batch with add().
+    """
+
+    queries: int = 0
+    parse_time: float = 0.0
+    resolve_time: float = 0.0
+    search_time: float = 0.0
+    reconstruct_time: float = 0.0
+    nodes_settled: int = 0
+    edges_relaxed: int = 0
+    heap_pushes: int = 0
+    path_length: int = 0
+
+    def add(self, other: "RouteStats"):
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+
+class StageTimer:
+    __slots__ = ("stats", "attribute", "start")
+
+    def __init__(self, stats: RouteStats, stage: str):
+        self.stats = stats
+        self.attribute = f"{stage}_time"
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_):
+        elapsed = time.perf_counter() - self.start
+        setattr(
+            self.stats, self.attribute, getattr(self.stats, self.attribute) + elapsed
+        )
+
+
+NO_TIMER = nullcontext()
+
+
+def timed(stats: RouteStats | None, stage: str):
+    """
+    `with timed(stats, "search"):` adds the block's wall time to the
+    stage, and costs next to nothing when stats is None.
+    """
+    if stats is None:
+        return NO_TIMER
+    return StageTimer(stats, stage)
+
 
 def parse_routers(routers: Routers) -> Graph:
     graph: Graph = {}
@@ -58,7 +159,14 @@ def parse_routers(routers: Routers) -> Graph:
     return graph
 
 
-def dijkstras_shortest_path(routers: Routers, src_ip: str, dest_ip: str) -> Nodes:
+def dijkstras_shortest_path(
+    routers: Routers,
+    src_ip: str,
+    dest_ip: str,
+    engine: str = DEFAULT_ENGINE,
+    stats: RouteStats | None = None,
+    router_table: RouterTable | None = None,
+) -> Nodes:
     """
     This function takes a dictionary representing the network, a source
     IP, and a destination IP, and returns a list with all the routers
@@ -110,29 +218,67 @@ def dijkstras_shortest_path(routers: Routers, src_ip: str, dest_ip: str) -> Node
     **Strong recommendation**: make functions to do subtasks within this
     function. Having it all built as a single wall of code is a recipe
     for madness.
+
+    `engine` picks the search implementation from ENGINES ("heap",
+    "linear" or "bidirectional"), or CSR_ENGINE to search a compiled topology.
+
+    An endpoint that no router serves gets an empty path, as does a
+    pair served by the same router.
+
+    With a RouteStats, the stage times and search counters of this
+    query are added to it.
+
+    Pass a RouterTable built once when querying the same routers many
+    times, so the endpoints are resolved through its address cache.
     """
+    # a one-query RoutingContext without a tree cache: one point-to-point
+    # search that stops at the destination
+    context = RoutingContext(routers, 0, engine, router_table=router_table, stats=stats)
+    return context.route(src_ip, dest_ip, stats)
 
-    graph = parse_routers(routers)
 
-    source_network = find_router_for_ip(routers, src_ip)
-    destination_network = find_router_for_ip(routers, dest_ip)
+def find_node_for_ip(
+    routers: Routers, ip: str, router_table: RouterTable | None = None
+) -> Node | None:
+    """
+    Return the graph node ("ip/netmask", as built by parse_routers) of
+    the router on the same subnet as ip, or None if there is none.
 
-    source_node = None
-    destination_node = None
+    The router is found by longest-prefix match, so every engine and
+    mode resolves an address to the same node. Pass a router_table
+    built once when resolving many addresses.
+    """
+    if router_table is None:
+        router_table = RouterTable(routers)
 
-    for node in graph.keys():
-        if node.startswith(source_network):
-            source_node = node
-        if node.startswith(destination_network):
-            destination_node = node
+    router = router_table.find_router(ip)
+
+    if router is None:
+        return None
 
-    if source_node == destination_node:
-        return []
+    return f"{router}{routers[router]['netmask']}"
 
-    return do_dijkstra_shortest_path(graph, source_node, destination_node)
+
+def do_dijkstra_shortest_path(
+    graph: Graph,
+    source_node: Node,
+    destination_node: Node,
+    stats: RouteStats | None = None,
+):
+    with timed(stats, "search"):
+        parent = linear_search(graph, source_node)
+
+    if stats is not None:
+        # no heap: every node is settled and relaxes all its edges
+        stats.nodes_settled += len(graph)
+        stats.edges_relaxed += sum(len(neighbors) for neighbors in graph.values())
+
+    with timed(stats, "reconstruct"):
+        routers_list = reconstruct_path(parent, source_node, destination_node)
+    return routers_list
 
 
-def do_dijkstra_shortest_path(graph: Graph, source_node: Node, destination_node: Node):
+def linear_search(graph: Graph, source_node: Node) -> dict[Node, Node]:
     nodes_to_visit: Nodes = []
     distances: dict[Node, int] = {}
     parent: dict[Node, Node] = {}
@@ -155,10 +301,293 @@ def do_dijkstra_shortest_path(graph: Graph, source_node: Node, destination_node:
                     distances[neighbor] = total_distance
                     parent[neighbor] = closest_node
 
-    routers_list = reconstruct_path(parent, source_node, destination_node)
+    return parent
+
+
+def node_order(graph: Graph) -> dict[Node, int]:
+    """
+    Position of every node in the graph's insertion order, the order
+    in which the linear search scans for the closest node.
+    """
+    return {node: index for index, node in enumerate(graph.keys())}
+
+
+def heap_search(
+    graph: Graph,
+    source_node: Node,
+    destination_node: Node | None = None,
+    stats: RouteStats | None = None,
+    order: dict[Node, int] | None = None,
+) -> tuple[dict[Node, int], dict[Node, Node]]:
+    """
+    Run Dijkstra from source_node using a binary heap and return the
+    (distances, parent) maps of every node settled.
+
+    Stale heap entries are skipped lazily (a node can be pushed more
+    than once, only the first pop counts). When destination_node is
+    given the search stops as soon as it is settled, otherwise the whole
+    shortest-path tree is built.
+
+    Heap entries are (distance, position in node_order, node), so nodes
+    at the same distance are settled in graph order, as the linear scan
+    does, and equal-cost ties give the same paths. Pass order when
+    searching the same graph many times.
+    """
+    if order is None:
+        order = node_order(graph)
+
+    distances: dict[Node, int] = {source_node: 0}
+    parent: dict[Node, Node] = {source_node: None}
+    settled: set[Node] = set()
+    heap: list[tuple[int, int, Node]] = [(0, order[source_node], source_node)]
+    pushes = 1
+
+    while len(heap) > 0:
+        distance, _, closest_node = heapq.heappop(heap)
+
+        if closest_node in settled:
+            continue
+        settled.add(closest_node)
+
+        if closest_node == destination_node:
+            break
+
+        for neighbor, neighbor_weight in graph[closest_node]:
+            if neighbor in settled or neighbor not in graph:
+                continue
+
+            total_distance = neighbor_weight + distance
+            if total_distance < distances.get(neighbor, math.inf):
+                distances[neighbor] = total_distance
+                parent[neighbor] = closest_node
+                heapq.heappush(heap, (total_distance, order[neighbor], neighbor))
+                pushes += 1
+
+    if stats is not None:
+        count_settled(stats, graph, settled, destination_node)
+        stats.heap_pushes += pushes
+
+    return distances, parent
+
+
+def count_settled(
+    stats: RouteStats, graph: Graph, settled: set[Node], stopped_at: Node | None
+):
+    """
+    Add the nodes settled and edges relaxed by a search to stats. A node
+    the search stopped at was settled but never relaxed its edges.
+    """
+    stats.nodes_settled += len(settled)
+    stats.edges_relaxed += sum(
+        len(graph[node]) for node in settled if node != stopped_at
+    )
+
+
+def heap_dijkstra_shortest_path(
+    graph: Graph,
+    source_node: Node,
+    destination_node: Node,
+    stats: RouteStats | None = None,
+    order: dict[Node, int] | None = None,
+) -> Nodes:
+    """
+    Same search as do_dijkstra_shortest_path, but the next node comes
+    from a binary heap instead of a linear scan (see heap_search).
+    """
+    with timed(stats, "search"):
+        _, parent = heap_search(graph, source_node, destination_node, stats, order)
+
+    with timed(stats, "reconstruct"):
+        routers_list = reconstruct_path(parent, source_node, destination_node)
     return routers_list
 
 
+def reverse_graph(graph: Graph) -> Graph:
+    """
+    Return the graph with every edge flipped. Edges that lead to a node
+    outside the graph are dropped, as no search can relax them anyway.
+    """
+    reverse: Graph = {node: set() for node in graph.keys()}
+
+    for node, neighbors in graph.items():
+        for neighbor, neighbor_weight in neighbors:
+            if neighbor in reverse:
+                reverse[neighbor].add((node, neighbor_weight))
+
+    return reverse
+
+
+def bidirectional_shortest_path(
+    graph: Graph,
+    source_node: Node,
+    destination_node: Node,
+    reverse: Graph | None = None,
+    stats: RouteStats | None = None,
+    order: dict[Node, int] | None = None,
+) -> Nodes:
+    """
+    Point-to-point Dijkstra run from both ends at once: forward from the
+    source on graph, backward from the destination on its reverse.
+
+    Every edge relaxed towards a node the other side has already
+    labelled gives a candidate path length. The search stops as soon as
+    the two heap minimums add up to at least the best candidate, which
+    then is a shortest path, so only the nodes around the two ends get
+    settled.
+
+    The two searches only give the shortest distance. The path is then
+    taken from the forward search alone, continued until it settles the
+    destination, so equal-cost ties are broken as heap_search breaks
+    them (in node_order) and the routers are the same as with the other
+    engines. The continued search is pruned to the nodes that can still
+    be on a shortest path: the backward distances (or, past the
+    backward frontier, its minimum) bound what is left to go, so it
+    settles little more than the path itself.
+
+    Pass reverse (reverse_graph) and order when searching the same
+    graph many times.
+    """
+    search_start = time.perf_counter()
+
+    if reverse is None:
+        reverse = reverse_graph(graph)
+    if order is None:
+        order = node_order(graph)
+
+    graphs = (graph, reverse)
+    distances: tuple[dict[Node, int], dict[Node, int]] = (
+        {source_node: 0},
+        {destination_node: 0},
+    )
+    parents: tuple[dict[Node, Node], dict[Node, Node]] = (
+        {source_node: None},
+        {destination_node: None},
+    )
+    settled: tuple[set[Node], set[Node]] = (set(), set())
+    heaps: tuple[list, list] = (
+        [(0, order[source_node], source_node)],
+        [(0, order[destination_node], destination_node)],
+    )
+    pushes = 2
+
+    best_distance = math.inf
+
+    while len(heaps[0]) > 0 and len(heaps[1]) > 0:
+        if heaps[0][0][0] + heaps[1][0][0] >= best_distance:
+            break
+
+        # expand the side with the smaller frontier minimum
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        other = 1 - side
+
+        distance, _, closest_node = heapq.heappop(heaps[side])
+        if closest_node in settled[side]:
+            continue
+        settled[side].add(closest_node)
+
+        for neighbor, neighbor_weight in graphs[side][closest_node]:
+            if neighbor in settled[side] or neighbor not in graph:
+                continue
+
+            total_distance = distance + neighbor_weight
+            if total_distance < distances[side].get(neighbor, math.inf):
+                distances[side][neighbor] = total_distance
+                parents[side][neighbor] = closest_node
+                heapq.heappush(
+                    heaps[side], (total_distance, order[neighbor], neighbor)
+                )
+                pushes += 1
+
+            if neighbor in distances[other]:
+                candidate = distances[side][neighbor] + distances[other][neighbor]
+                best_distance = min(best_distance, candidate)
+
+    if best_distance < math.inf:
+        pushes += finish_forward_search(
+            graph,
+            destination_node,
+            best_distance,
+            distances,
+            parents,
+            settled,
+            heaps,
+            order,
+        )
+
+    if stats is not None:
+        stats.search_time += time.perf_counter() - search_start
+        count_settled(stats, graph, settled[0], None)
+        count_settled(stats, reverse, settled[1], None)
+        stats.heap_pushes += pushes
+
+    if best_distance == math.inf:
+        # unreachable, same answer as reconstruct_path gives today
+        return [destination_node]
+
+    with timed(stats, "reconstruct"):
+        return reconstruct_path(parents[0], source_node, destination_node)
+
+
+def finish_forward_search(
+    graph: Graph,
+    destination_node: Node,
+    best_distance: int,
+    distances: tuple[dict[Node, int], dict[Node, int]],
+    parents: tuple[dict[Node, Node], dict[Node, Node]],
+    settled: tuple[set[Node], set[Node]],
+    heaps: tuple[list, list],
+    order: dict[Node, int],
+) -> int:
+    """
+    Carry on the forward half of bidirectional_shortest_path, in place,
+    until it settles the destination, skipping every node whose distance
+    plus a lower bound of what is left to go exceeds best_distance.
+    Returns the heap pushes made.
+
+    Every node on a shortest path passes that test, so those nodes are
+    settled in the same order, and get the same parents, as in an
+    unpruned heap_search.
+    """
+    backward_distances = distances[1]
+    backward_settled = settled[1]
+    # every node the backward search has not settled is at least this
+    # far from the destination
+    backward_frontier = heaps[1][0][0] if len(heaps[1]) > 0 else math.inf
+
+    def can_reach(node: Node, distance: int) -> bool:
+        if node in backward_settled:
+            return distance + backward_distances[node] <= best_distance
+        return distance + backward_frontier <= best_distance
+
+    distances, parents, settled, heap = distances[0], parents[0], settled[0], heaps[0]
+    pushes = 0
+
+    while destination_node not in settled and len(heap) > 0:
+        distance, _, closest_node = heapq.heappop(heap)
+
+        if closest_node in settled or not can_reach(closest_node, distance):
+            continue
+        settled.add(closest_node)
+
+        if closest_node == destination_node:
+            break
+
+        for neighbor, neighbor_weight in graph[closest_node]:
+            if neighbor in settled or neighbor not in graph:
+                continue
+
+            total_distance = neighbor_weight + distance
+            if total_distance < distances.get(neighbor, math.inf) and can_reach(
+                neighbor, total_distance
+            ):
+                distances[neighbor] = total_distance
+                parents[neighbor] = closest_node
+                heapq.heappush(heap, (total_distance, order[neighbor], neighbor))
+                pushes += 1
+
+    return pushes
+
+
 def reconstruct_path(
     parent: dict[Node, Node], source_node: Node, destination_node: Node
 ) -> Nodes:
@@ -170,7 +599,7 @@ def reconstruct_path(
     while True:
         routers.append(current_node)
 
-        current_node = parent[current_node]
+        current_node = parent.get(current_node)
 
         if current_node is None:
             # got to the finish
@@ -194,6 +623,399 @@ def find_closest_node(nodes: Nodes, distances: dict[Node, int]) -> Node:
     return closest_node
 
 
+ENGINES = {
+    "linear": do_dijkstra_shortest_path,
+    "heap": heap_dijkstra_shortest_path,
+    "bidirectional": bidirectional_shortest_path,
+}
+
+ENGINE_NAMES = [*ENGINES, CSR_ENGINE]
+
+
+def default_tree_cache_size(node_count: int, engine: str = DEFAULT_ENGINE) -> int:
+    """
+    How many trees of a node_count-node topology fit in
+    TREE_CACHE_MEMORY_BUDGET, capped at DEFAULT_TREE_CACHE_SIZE.
+    """
+    tree_bytes = max(node_count, 1) * TREE_BYTES_PER_NODE[engine]
+    return max(1, min(DEFAULT_TREE_CACHE_SIZE, TREE_CACHE_MEMORY_BUDGET // tree_bytes))
+
+
+# Engines RoutingContext can build shortest-path trees with.
+TREE_ENGINES = ("heap", CSR_ENGINE)
+
+
+class RoutingContext:
+    """
+    A parsed topology shared by a batch of route queries.
+
+    The graph is parsed once, endpoint IPs are resolved through one
+    RouterTable and its address cache, and one full shortest-path tree
+    is kept per source node in a bounded LRU cache, so every pair that
+    shares a source router is answered by walking the same tree.
+
+    Engines without trees ("linear", "bidirectional"), or a cache_size
+    of 0, answer every pair with its own point-to-point search instead,
+    still on the graph (and reverse graph) parsed once for the batch.
+
+    With the "heap" engine the trees are heap_search parent maps over a
+    Graph; with CSR_ENGINE they are csr_search parent arrays over a
+    CompiledTopology. An already compiled topology can be passed in, in
+    which case routers only needs each router's "netmask".
+
+    Without a cache_size, as many trees are kept as
+    default_tree_cache_size allows for the size of the topology.
+
+    An endpoint that no router serves gets an empty path, like a pair
+    served by the same router (and as in parallel_find_routes).
+
+    With a RouteStats the parse time goes into it; the query methods
+    take their own, so they can be traced one by one.
+    """
+
+    graph: Graph | None = None
+    order: dict[Node, int] | None = None
+    reverse: Graph | None = None
+    topology: CompiledTopology | None = None
+
+    def __init__(
+        self,
+        routers: Routers,
+        cache_size: int | None = None,
+        engine: str = DEFAULT_ENGINE,
+        topology: CompiledTopology | None = None,
+        router_table: RouterTable | None = None,
+        stats: RouteStats | None = None,
+    ):
+        if topology is not None:
+            engine = CSR_ENGINE
+
+        if cache_size is not None and cache_size < 0:
+            raise ValueError("cache_size must not be negative")
+        if engine not in ENGINE_NAMES:
+            raise ValueError(f"engine must be one of {ENGINE_NAMES}")
+
+        self.routers = routers
+        self.engine = engine
+
+        with timed(stats, "parse"):
+            if topology is not None:
+                self.topology = topology
+            elif engine == CSR_ENGINE:
+                self.topology = compile_topology(routers)
+            else:
+                self.graph = parse_routers(routers)
+                self.order = node_order(self.graph)
+                if engine == "bidirectional":
+                    self.reverse = reverse_graph(self.graph)
+
+            if router_table is None:
+                router_table = RouterTable(routers)
+            self.router_table = router_table
+
+        if engine not in TREE_ENGINES:
+            cache_size = 0
+        elif cache_size is None:
+            if self.topology is not None:
+                node_count = self.topology.node_count
+            else:
+                node_count = len(self.graph)
+            cache_size = default_tree_cache_size(node_count, engine)
+        self.cache_size = cache_size
+
+        self.trees: OrderedDict[Node, dict | array] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def find_node(self, ip: str) -> Node | None:
+        return find_node_for_ip(self.routers, ip, self.router_table)
+
+    def build_tree(
+        self, source_node: Node, stats: RouteStats | None = None
+    ) -> dict | array:
+        if self.topology is not None:
+            source = self.topology.node_id_for_name(source_node)
+            _, tree = csr_search(self.topology, source, stats=stats)
+        else:
+            _, tree = heap_search(
+                self.graph, source_node, stats=stats, order=self.order
+            )
+
+        return tree
+
+    def shortest_path_tree(
+        self, source_node: Node, stats: RouteStats | None = None
+    ) -> dict | array:
+        tree = self.trees.get(source_node)
+
+        if tree is not None:
+            self.hits += 1
+            self.trees.move_to_end(source_node)
+            return tree
+
+        self.misses += 1
+        tree = self.build_tree(source_node, stats)
+
+        self.trees[source_node] = tree
+        if len(self.trees) > self.cache_size:
+            self.trees.popitem(last=False)
+
+        return tree
+
+    def route_nodes(
+        self,
+        source_node: Node,
+        destination_node: Node,
+        stats: RouteStats | None = None,
+    ) -> Nodes:
+        if source_node is None or destination_node is None:
+            return []
+        if source_node == destination_node:
+            return []
+
+        if self.cache_size == 0:
+            path = self.search(source_node, destination_node, stats)
+        else:
+            with timed(stats, "search"):
+                tree = self.shortest_path_tree(source_node, stats)
+
+            with timed(stats, "reconstruct"):
+                if self.topology is not None:
+                    destination_id = self.topology.node_id_for_name(destination_node)
+                    path = reconstruct_csr_path(self.topology, tree, destination_id)
+                else:
+                    path = reconstruct_path(tree, source_node, destination_node)
+
+        if stats is not None:
+            stats.path_length += len(path)
+        return path
+
+    def search(
+        self,
+        source_node: Node,
+        destination_node: Node,
+        stats: RouteStats | None = None,
+    ) -> Nodes:
+        """
+        One point-to-point search with the context's engine, stopping at
+        the destination, without touching the tree cache.
+        """
+        if self.topology is not None:
+            source = self.topology.node_id_for_name(source_node)
+            destination = self.topology.node_id_for_name(destination_node)
+
+            with timed(stats, "search"):
+                _, parent = csr_search(self.topology, source, destination, stats)
+
+            with timed(stats, "reconstruct"):
+                return reconstruct_csr_path(self.topology, parent, destination)
+
+        if self.engine == "bidirectional":
+            return bidirectional_shortest_path(
+                self.graph,
+                source_node,
+                destination_node,
+                self.reverse,
+                stats,
+                self.order,
+            )
+
+        if self.engine == "heap":
+            return heap_dijkstra_shortest_path(
+                self.graph, source_node, destination_node, stats, self.order
+            )
+
+        return do_dijkstra_shortest_path(
+            self.graph, source_node, destination_node, stats
+        )
+
+    def route(
+        self, src_ip: str, dest_ip: str, stats: RouteStats | None = None
+    ) -> Nodes:
+        if stats is not None:
+            stats.queries += 1
+
+        with timed(stats, "resolve"):
+            source_node = self.find_node(src_ip)
+            destination_node = self.find_node(dest_ip)
+
+        return self.route_nodes(source_node, destination_node, stats)
+
+    def route_batch(self, src_dest_pairs) -> list[Nodes]:
+        """
+        Answer every pair, visiting them grouped by source node so each
+        tree is built at most once per batch. The paths are returned in
+        the same order as the input pairs.
+        """
+        endpoints = [
+            (self.find_node(src_ip), self.find_node(dest_ip))
+            for src_ip, dest_ip in src_dest_pairs
+        ]
+
+        pairs_by_source: dict[Node, list[int]] = {}
+        for index, (source_node, _) in enumerate(endpoints):
+            pairs_by_source.setdefault(source_node, []).append(index)
+
+        paths: list[Nodes] = [None] * len(endpoints)
+        for source_node, indices in pairs_by_source.items():
+            for index in indices:
+                paths[index] = self.route_nodes(source_node, endpoints[index][1])
+
+        return paths
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_trees": len(self.trees),
+            "cache_size": self.cache_size,
+        }
+
+
+def batch_context(
+    routers: Routers,
+    engine: str = DEFAULT_ENGINE,
+    tree_cache_size: int | None = None,
+    stats: RouteStats | None = None,
+) -> RoutingContext:
+    """
+    The RoutingContext find_routes answers a batch with. The
+    shortest-path tree cache is built on the heap and csr engines; any
+    other engine, or a cache size of 0 or less, answers each pair with
+    its own search, on the graph parsed once for the batch. Without a
+    size, the cache is sized to the topology.
+    """
+    if tree_cache_size is not None:
+        tree_cache_size = max(tree_cache_size, 0)
+    return RoutingContext(routers, tree_cache_size, engine, stats=stats)
+
+
+def route_pairs(
+    context: RoutingContext,
+    src_dest_pairs,
+    stats: RouteStats | None = None,
+    trace=None,
+) -> list[Nodes]:
+    """
+    Route every pair of a batch. With stats, every query gets its own
+    RouteStats that is added to stats (the batch total) and, with a
+    trace file, written to it as a JSON line, in input order.
+    """
+    if stats is None:
+        return context.route_batch(src_dest_pairs)
+
+    paths = []
+    for src_ip, dest_ip in src_dest_pairs:
+        one_query = RouteStats()
+        paths.append(context.route(src_ip, dest_ip, one_query))
+        stats.add(one_query)
+        if trace is not None:
+            print(one_query.to_json(), file=trace)
+
+    return paths
+
+
+def stream_routes(file_name, engine=CSR_ENGINE, tree_cache_size=None):
+    """
+    Streaming mode: read the topology file with stream_topology and
+    answer each pair as it is read, so the JSON text is never held in
+    memory. With CSR_ENGINE the routers are compiled straight into a
+    CompiledTopology and the full routers dict is not kept either; any
+    other engine needs the routers dict, and is used as in find_routes.
+    tree_cache_size is treated as in batch_context.
+
+    Pairs that come before the "routers" section have to wait for the
+    topology, so they are buffered until it is complete.
+    """
+    if tree_cache_size is not None:
+        tree_cache_size = max(tree_cache_size, 0)
+
+    builder = TopologyBuilder()
+    router_table = RouterTable()
+    routers: Routers = {}
+    context = None
+    pending_pairs = []
+
+    def finish():
+        if engine != CSR_ENGINE:
+            return RoutingContext(
+                routers, tree_cache_size, engine, router_table=router_table
+            )
+
+        return RoutingContext(
+            routers,
+            tree_cache_size,
+            topology=builder.finish(),
+            router_table=router_table,
+        )
+
+    for key, item in stream_topology(file_name):
+        if key == "routers":
+            router, router_info = item
+            router_table.add(router, router_info["netmask"])
+            if engine != CSR_ENGINE:
+                routers[router] = router_info
+            else:
+                builder.add_router(router, router_info)
+                routers[router] = {"netmask": router_info["netmask"]}
+        elif key == "src-dest":
+            if len(routers) == 0:
+                pending_pairs.append(item)
+                continue
+            if context is None:
+                context = finish()
+
+            src_ip, dest_ip = item
+            path = context.route(src_ip, dest_ip)
+            print(f"{src_ip:>15s} -> {dest_ip:<15s}  {repr(path)}")
+
+    if len(pending_pairs) > 0:
+        if context is None:
+            context = finish()
+        for src_ip, dest_ip in pending_pairs:
+            path = context.route(src_ip, dest_ip)
+            print(f"{src_ip:>15s} -> {dest_ip:<15s}  {repr(path)}")
+
+    return context
+
+
+def find_routes_with_table(table: RoutingTable, src_dest_pairs):
+    """
+    All-pairs mode: answer every pair by walking a precomputed
+    RoutingTable instead of searching the graph.
+    """
+    for src_ip, dest_ip in src_dest_pairs:
+        path = table.route_ips(src_ip, dest_ip)
+        print(f"{src_ip:>15s} -> {dest_ip:<15s}  {repr(path)}")
+
+
+def find_routes_with_hierarchy(
+    hierarchy: ContractionHierarchy, routers, src_dest_pairs
+):
+    """
+    Answer every pair with a contraction hierarchy query. The routers
+    are only used to resolve the endpoint IPs to graph nodes.
+
+    Unlike the ENGINES, this does not break equal-cost ties in graph
+    order: every path has the same cost as theirs, but not necessarily
+    the same routers.
+    """
+    router_table = RouterTable(routers)
+
+    for src_ip, dest_ip in src_dest_pairs:
+        source_node = find_node_for_ip(routers, src_ip, router_table)
+        destination_node = find_node_for_ip(routers, dest_ip, router_table)
+
+        path = []
+        if None not in (source_node, destination_node) and (
+            source_node != destination_node
+        ):
+            path = hierarchy.shortest_path(source_node, destination_node)
+
+        print(f"{src_ip:>15s} -> {dest_ip:<15s}  {repr(path)}")
+
+
 # ------------------------------
 # DO NOT MODIFY BELOW THIS LINE
 # ------------------------------
@@ -204,29 +1026,128 @@ def read_routers(file_name):
     return json.loads(data)
 
 
-def find_routes(routers, src_dest_pairs):
-    for src_ip, dest_ip in src_dest_pairs:
-        path = dijkstras_shortest_path(routers, src_ip, dest_ip)
+def find_routes(
+    routers,
+    src_dest_pairs,
+    engine=DEFAULT_ENGINE,
+    tree_cache_size=None,
+    stats: RouteStats | None = None,
+    trace=None,
+):
+    context = batch_context(routers, engine, tree_cache_size, stats)
+    paths = route_pairs(context, src_dest_pairs, stats, trace)
+
+    for (src_ip, dest_ip), path in zip(src_dest_pairs, paths):
         print(f"{src_ip:>15s} -> {dest_ip:<15s}  {repr(path)}")
 
+    return context
+
 
 def usage():
-    print("usage: dijkstra.py infile.json", file=sys.stderr)
+    print(
+        f"usage: dijkstra.py infile.json [--engine={'|'.join(ENGINE_NAMES)}] "
+        "[--tree-cache=N] [--stats] [--profile] [--trace] "
+        "[--save-table=FILE | --table=FILE] "
+        "[--save-ch=FILE | --ch=FILE] [--stream] "
+        "[--workers=N [--output=FILE] [--format=text|binary]]",
+        file=sys.stderr,
+    )
 
 
 def main(argv):
+    positional, options = parse_options(argv)
+
     try:
-        router_file_name = argv[1]
+        router_file_name = positional[1]
     except:
         usage()
         return 1
 
+    # streaming compiles the topology unless another engine is asked for
+    default_engine = CSR_ENGINE if "stream" in options else DEFAULT_ENGINE
+    engine = options.get("engine", default_engine)
+    if engine not in ENGINE_NAMES:
+        usage()
+        return 1
+
+    try:
+        tree_cache_size = None
+        if "tree-cache" in options:
+            tree_cache_size = int(options["tree-cache"])
+    except ValueError:
+        usage()
+        return 1
+
+    if "stream" in options:
+        context = stream_routes(router_file_name, engine, tree_cache_size)
+        if "stats" in options and context is not None:
+            print(json.dumps(context.stats()), file=sys.stderr)
+        return 0
+
     json_data = read_routers(router_file_name)
 
     routers = json_data["routers"]
     routes = json_data["src-dest"]
 
-    find_routes(routers, routes)
+    # All-pairs mode: --save-table builds the full routing table from the
+    # topology and writes it out, --table maps a previously saved one.
+    if "save-table" in options:
+        table = build_routing_table(compile_topology(routers))
+        save_routing_table(table, options["save-table"])
+        find_routes_with_table(table, routes)
+        return 0
+
+    if "table" in options:
+        find_routes_with_table(load_routing_table(options["table"]), routes)
+        return 0
+
+    # Parallel batch mode: one shared topology, a pool of processes and
+    # a buffered writer instead of one print per pair.
+    if "workers" in options:
+        output_format = options.get("format", "text")
+        if output_format not in OUTPUT_FORMATS:
+            usage()
+            return 1
+
+        sys.stdout.flush()
+        workers = None if options["workers"] == "true" else int(options["workers"])
+
+        if "output" in options:
+            with open(options["output"], "wb") as output:
+                parallel_find_routes(routers, routes, workers, output, output_format)
+        else:
+            parallel_find_routes(routers, routes, workers, None, output_format)
+        return 0
+
+    # Contraction hierarchy: --save-ch preprocesses the graph and writes
+    # the hierarchy out, --ch loads a previously saved one. The paths
+    # are as short as the other engines', but where several are equally
+    # short the hierarchy may pick a different one (see README.md).
+    if "save-ch" in options:
+        hierarchy = build_contraction_hierarchy(parse_routers(routers))
+        save_contraction_hierarchy(hierarchy, options["save-ch"])
+        find_routes_with_hierarchy(hierarchy, routers, routes)
+        return 0
+
+    if "ch" in options:
+        hierarchy = load_contraction_hierarchy(options["ch"])
+        find_routes_with_hierarchy(hierarchy, routers, routes)
+        return 0
+
+    # --profile writes the per-stage totals of the batch to stderr as
+    # JSON, --trace also writes one JSON line per query before them.
+    stats = None
+    if "profile" in options or "trace" in options:
+        stats = RouteStats()
+    trace = sys.stderr if "trace" in options else None
+
+    context = find_routes(routers, routes, engine, tree_cache_size, stats, trace)
+
+    if "stats" in options and context is not None:
+        print(json.dumps(context.stats()), file=sys.stderr)
+
+    if stats is not None:
+        print(stats.to_json(), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+import math
+import heapq
+from collections import OrderedDict
+
+from dijkstra import (
+    DEFAULT_TREE_CACHE_SIZE,
+    TREE_CACHE_MEMORY_BUDGET,
+    Node,
+    Nodes,
+    Routers,
+    find_node_for_ip,
+    parse_routers,
+    reconstruct_path,
+)
+from subnets_and_masks.netfuncs import RouterTable
+
+
+Adjacency = dict[Node, dict[Node, int]]
+
+# About what one node costs in a ShortestPathTree: a distance and a
+# parent dict entry, and a place in its parent's children set.
+SHORTEST_PATH_TREE_BYTES_PER_NODE = 160
+
+
+class ShortestPathTree:
+    """
+    A shortest-path tree from one source that can be repaired in place
+    when an edge weight changes, instead of being rebuilt.
+
+    A cheaper edge (or a new one) can only improve the nodes reachable
+    through it, so it is handled by resuming Dijkstra from its head. A
+    more expensive edge (or a removed one) only matters if it is a tree
+    edge: then the subtree hanging off it is cut loose, every node in it
+    is re-seeded from its best in-neighbour outside the subtree, and
+    Dijkstra runs again restricted to that subtree.
+
+    Every repair returns how many nodes it re-settled.
+    """
+
+    def __init__(self, adjacency: Adjacency, source: Node):
+        self.source = source
+
+        self.distances: dict[Node, int] = {source: 0}
+        self.parent: dict[Node, Node] = {source: None}
+        self.children: dict[Node, set[Node]] = {}
+
+        self.propagate(adjacency, [(0, source)])
+
+    def set_parent(self, node: Node, parent: Node | None):
+        old_parent = self.parent.get(node)
+        if old_parent in self.children:
+            self.children[old_parent].discard(node)
+
+        self.parent[node] = parent
+        if parent is not None:
+            self.children.setdefault(parent, set()).add(node)
+
+    def propagate(
+        self,
+        adjacency: Adjacency,
+        heap: list[tuple[int, Node]],
+        region: set[Node] | None = None,
+    ) -> int:
+        """
+        Run Dijkstra from the seeded heap, only lowering distances.
+        With a region, only nodes inside it are relaxed.
+        """
+        heapq.heapify(heap)
+        settled: set[Node] = set()
+
+        while len(heap) > 0:
+            distance, closest_node = heapq.heappop(heap)
+
+            if closest_node in settled:
+                continue
+            if distance > self.distances.get(closest_node, math.inf):
+                continue
+            settled.add(closest_node)
+
+            for neighbor, neighbor_weight in adjacency[closest_node].items():
+                if neighbor in settled or neighbor not in adjacency:
+                    continue
+                if region is not None and neighbor not in region:
+                    continue
+
+                total_distance = distance + neighbor_weight
+                if total_distance < self.distances.get(neighbor, math.inf):
+                    self.distances[neighbor] = total_distance
+                    self.set_parent(neighbor, closest_node)
+                    heapq.heappush(heap, (total_distance, neighbor))
+
+        return len(settled)
+
+    def decrease(self, adjacency: Adjacency, tail: Node, head: Node) -> int:
+        if tail not in self.distances or head not in adjacency:
+            return 0
+
+        total_distance = self.distances[tail] + adjacency[tail][head]
+        if total_distance >= self.distances.get(head, math.inf):
+            return 0
+
+        self.distances[head] = total_distance
+        self.set_parent(head, tail)
+
+        return self.propagate(adjacency, [(total_distance, head)])
+
+    def increase(
+        self,
+        adjacency: Adjacency,
+        reverse: dict[Node, set[Node]],
+        tail: Node,
+        head: Node,
+    ) -> int:
+        if self.parent.get(head) != tail or head == self.source:
+            return 0
+
+        affected: set[Node] = set()
+        stack = [head]
+        while len(stack) > 0:
+            node = stack.pop()
+            affected.add(node)
+            stack.extend(self.children.pop(node, ()))
+
+        for node in affected:
+            self.set_parent(node, None)
+            del self.parent[node]
+            del self.distances[node]
+
+        heap: list[tuple[int, Node]] = []
+        for node in affected:
+            for predecessor in reverse.get(node, ()):
+                if predecessor not in self.distances:
+                    continue
+
+                edge_weight = adjacency[predecessor][node]
+                total_distance = self.distances[predecessor] + edge_weight
+                if total_distance < self.distances.get(node, math.inf):
+                    self.distances[node] = total_distance
+                    self.set_parent(node, predecessor)
+
+            if node in self.distances:
+                heap.append((self.distances[node], node))
+
+        return self.propagate(adjacency, heap, affected)
+
+
+class DynamicRouting:
+    """
+    Route queries over a topology that changes while it is loaded.
+
+    Connections can be added, removed or have their "ad" changed; the
+    routers dict is kept in step and every cached ShortestPathTree is
+    repaired rather than recomputed. Each update returns the number of
+    nodes it re-settled across all cached trees (also kept in
+    last_resettled).
+
+    One tree is kept per source node in a bounded LRU cache, as in
+    RoutingContext, so memory use and the cost of an update are bounded
+    by cache_size, not by how many sources were ever queried. A source
+    whose tree was evicted gets a new one built on its next query.
+    Without a cache_size, as many trees are kept as fit in
+    TREE_CACHE_MEMORY_BUDGET, up to DEFAULT_TREE_CACHE_SIZE.
+
+    A link going down between two routers is two remove_connection
+    calls, one per direction, as each router lists its own connections.
+    """
+
+    def __init__(self, routers: Routers, cache_size: int | None = None):
+        if cache_size is not None and cache_size < 1:
+            raise ValueError("cache_size must be at least 1")
+
+        self.routers = routers
+        self.adjacency: Adjacency = {}
+        self.reverse: dict[Node, set[Node]] = {}
+
+        for node, neighbors in parse_routers(routers).items():
+            self.adjacency.setdefault(node, {})
+            for neighbor, neighbor_weight in neighbors:
+                self.adjacency[node][neighbor] = neighbor_weight
+                self.reverse.setdefault(neighbor, set()).add(node)
+
+        # connections change, the routers and their subnets do not
+        self.router_table = RouterTable(routers)
+
+        if cache_size is None:
+            tree_bytes = max(len(self.adjacency), 1) * SHORTEST_PATH_TREE_BYTES_PER_NODE
+            cache_size = max(
+                1, min(DEFAULT_TREE_CACHE_SIZE, TREE_CACHE_MEMORY_BUDGET // tree_bytes)
+            )
+        self.cache_size = cache_size
+
+        self.trees: OrderedDict[Node, ShortestPathTree] = OrderedDict()
+        self.last_resettled = 0
+
+    def router_node(self, router: str) -> Node:
+        return f"{router}{self.routers[router]['netmask']}"
+
+    def tree(self, source_node: Node) -> ShortestPathTree:
+        tree = self.trees.get(source_node)
+
+        if tree is not None:
+            self.trees.move_to_end(source_node)
+            return tree
+
+        tree = ShortestPathTree(self.adjacency, source_node)
+
+        self.trees[source_node] = tree
+        if len(self.trees) > self.cache_size:
+            self.trees.popitem(last=False)
+
+        return tree
+
+    def route(self, src_ip: str, dest_ip: str) -> Nodes:
+        source_node = find_node_for_ip(self.routers, src_ip, self.router_table)
+        destination_node = find_node_for_ip(self.routers, dest_ip, self.router_table)
+
+        if source_node is None or destination_node is None:
+            return []
+        if source_node == destination_node:
+            return []
+
+        tree = self.tree(source_node)
+        return reconstruct_path(tree.parent, source_node, destination_node)
+
+    def add_connection(
+        self,
+        router: str,
+        connection: str,
+        netmask: str,
+        ad: int,
+        interface: str = "",
+    ) -> int:
+        connections = self.routers[router]["connections"]
+
+        resettled = 0
+        if connection in connections:
+            resettled += self.remove_connection(router, connection)
+
+        connections[connection] = {
+            "netmask": netmask,
+            "interface": interface,
+            "ad": ad,
+        }
+        head = f"{connection}{netmask}"
+        resettled += self.update_edge(self.router_node(router), head, ad)
+
+        self.last_resettled = resettled
+        return resettled
+
+    def remove_connection(self, router: str, connection: str) -> int:
+        connection_info = self.routers[router]["connections"].pop(connection)
+        head = f"{connection}{connection_info['netmask']}"
+
+        return self.update_edge(self.router_node(router), head, None)
+
+    def set_ad(self, router: str, connection: str, ad: int) -> int:
+        connection_info = self.routers[router]["connections"][connection]
+        connection_info["ad"] = ad
+        head = f"{connection}{connection_info['netmask']}"
+
+        return self.update_edge(self.router_node(router), head, ad)
+
+    def update_edge(self, tail: Node, head: Node, weight: int | None) -> int:
+        """
+        Set the weight of tail -> head (None removes the edge) and repair
+        every cached tree.
+        """
+        old_weight = self.adjacency[tail].get(head)
+
+        if weight is None:
+            self.adjacency[tail].pop(head, None)
+            self.reverse.get(head, set()).discard(tail)
+        else:
+            self.adjacency[tail][head] = weight
+            self.reverse.setdefault(head, set()).add(tail)
+
+        resettled = 0
+        for tree in self.trees.values():
+            if weight is not None and (old_weight is None or weight < old_weight):
+                resettled += tree.decrease(self.adjacency, tail, head)
+            elif old_weight is not None and (weight is None or weight > old_weight):
+                resettled += tree.increase(self.adjacency, self.reverse, tail, head)
+
+        self.last_resettled = resettled
+        return resettled
@@ -0,0 +1,193 @@
+import sys
+import json
+import random
+
+from subnets_and_masks.netfuncs import parse_options, value_to_ipv4
+
+
+DISTRIBUTIONS = ("uniform", "powerlaw")
+
+FIRST_NETWORK = 0x0A000000  # 10.0.0.0
+INTERFACE_PREFIX = "en"
+
+
+def allocate_networks(
+    prefix_lengths: list[int], first_network: int = FIRST_NETWORK
+) -> list[int]:
+    """
+    Hand out one aligned, non-overlapping network per prefix length, in
+    order, starting at first_network.
+    """
+    networks = []
+    cursor = first_network
+
+    for prefix_length in prefix_lengths:
+        block_size = 1 << (32 - prefix_length)
+        cursor = (cursor + block_size - 1) & ~(block_size - 1)
+
+        networks.append(cursor)
+        cursor += block_size
+
+    return networks
+
+
+def random_links(
+    router_count: int, degree: int, distribution: str, rng: random.Random
+) -> set[tuple[int, int]]:
+    """
+    Undirected links (lower index first) of a connected graph with an
+    average degree of about `degree`.
+
+    "uniform" links every router to a random earlier one (so the graph
+    is connected) and then adds random links until the degree is
+    reached. "powerlaw" uses preferential attachment: every new router
+    links to degree // 2 earlier routers picked in proportion to their
+    degree, which gives a few heavily connected hubs.
+    """
+    links: set[tuple[int, int]] = set()
+
+    def link(a: int, b: int) -> bool:
+        if a == b:
+            return False
+        edge = (min(a, b), max(a, b))
+        if edge in links:
+            return False
+        links.add(edge)
+        return True
+
+    if distribution == "uniform":
+        for router in range(1, router_count):
+            link(router, rng.randrange(router))
+
+        wanted = min(
+            router_count * degree // 2, router_count * (router_count - 1) // 2
+        )
+        while len(links) < wanted:
+            link(rng.randrange(router_count), rng.randrange(router_count))
+
+    elif distribution == "powerlaw":
+        links_per_router = max(1, degree // 2)
+        # every link end appears once, so picking from this list picks a
+        # router in proportion to its degree
+        link_ends: list[int] = [0]
+
+        for router in range(1, router_count):
+            targets = set()
+            while len(targets) < min(links_per_router, router):
+                targets.add(rng.choice(link_ends))
+
+            for target in targets:
+                link(router, target)
+                link_ends.extend((router, target))
+
+    else:
+        raise ValueError(f"distribution must be one of {DISTRIBUTIONS}")
+
+    return links
+
+
+def generate_topology(
+    router_count: int,
+    degree: int = 3,
+    distribution: str = "uniform",
+    prefix_lengths: tuple[int, ...] = (24,),
+    weight_range: tuple[int, int] = (1, 100),
+    pair_count: int = 100,
+    seed: int | None = None,
+) -> dict:
+    """
+    Build a topology in the same schema as example1.json: a "routers"
+    section (connections with netmask/interface/ad, netmask, if_count,
+    if_prefix) and a "src-dest" list of host pairs. Every router is the
+    .1 of its own subnet, links are symmetric (same "ad" both ways) and
+    the hosts in the pairs are picked from the routers' subnets.
+    """
+    rng = random.Random(seed)
+
+    router_prefixes = [rng.choice(prefix_lengths) for _ in range(router_count)]
+    networks = allocate_networks(router_prefixes)
+    router_ips = [value_to_ipv4(network + 1) for network in networks]
+
+    routers = {
+        router_ip: {
+            "connections": {},
+            "netmask": f"/{prefix_length}",
+            "if_count": 0,
+            "if_prefix": INTERFACE_PREFIX,
+        }
+        for router_ip, prefix_length in zip(router_ips, router_prefixes)
+    }
+
+    def connect(a: int, b: int, weight: int):
+        router_info = routers[router_ips[a]]
+        router_info["connections"][router_ips[b]] = {
+            "netmask": f"/{router_prefixes[b]}",
+            "interface": f"{INTERFACE_PREFIX}{router_info['if_count']}",
+            "ad": weight,
+        }
+        router_info["if_count"] += 1
+
+    for a, b in sorted(random_links(router_count, degree, distribution, rng)):
+        weight = rng.randint(*weight_range)
+        connect(a, b, weight)
+        connect(b, a, weight)
+
+    def random_host() -> str:
+        router = rng.randrange(router_count)
+        host_count = (1 << (32 - router_prefixes[router])) - 2
+        return value_to_ipv4(networks[router] + 1 + rng.randrange(max(host_count, 1)))
+
+    src_dest = [[random_host(), random_host()] for _ in range(pair_count)]
+
+    return {"routers": routers, "src-dest": src_dest}
+
+
+def usage():
+    print(
+        "usage: generate_topology.py outfile.json --routers=N [--degree=3] "
+        f"[--distribution={'|'.join(DISTRIBUTIONS)}] [--prefixes=24,16] "
+        "[--weights=1-100] [--pairs=100] [--seed=N]",
+        file=sys.stderr,
+    )
+
+
+def main(argv):
+    positional, options = parse_options(argv)
+
+    try:
+        out_file_name = positional[1]
+        router_count = int(options["routers"])
+        degree = int(options.get("degree", 3))
+        distribution = options.get("distribution", "uniform")
+        prefix_lengths = tuple(
+            int(prefix) for prefix in options.get("prefixes", "24").split(",")
+        )
+        low, high = options.get("weights", "1-100").split("-")
+        pair_count = int(options.get("pairs", 100))
+        seed = int(options["seed"]) if "seed" in options else None
+    except (IndexError, KeyError, ValueError):
+        usage()
+        return 1
+
+    if distribution not in DISTRIBUTIONS:
+        usage()
+        return 1
+
+    topology = generate_topology(
+        router_count,
+        degree,
+        distribution,
+        prefix_lengths,
+        (int(low), int(high)),
+        pair_count,
+        seed,
+    )
+
+    with open(out_file_name, "w") as fp:
+        json.dump(topology, fp, indent=4)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
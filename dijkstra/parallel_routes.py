@@ -0,0 +1,235 @@
+import os
+import sys
+import struct
+import multiprocessing
+
+from multiprocessing import shared_memory
+
+from subnets_and_masks.netfuncs import PrefixIndex
+from topology import (
+    CompiledTopology,
+    NodeId,
+    compile_topology,
+    csr_path,
+    csr_search,
+)
+
+
+# How many source groups each pool task carries.
+DEFAULT_TASK_CHUNK = 16
+
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+OUTPUT_FORMATS = ("text", "binary")
+
+# Binary output record: hop count, then (address, prefix length) per hop.
+HOP_COUNT_FORMAT = ">H"
+HOP_FORMAT = ">IB"
+
+# Filled in by init_worker in every pool process.
+worker_topology: CompiledTopology | None = None
+worker_memory: shared_memory.SharedMemory | None = None
+
+
+def share_topology(
+    topology: CompiledTopology,
+) -> tuple[shared_memory.SharedMemory, tuple[int, int]]:
+    """
+    Copy the CSR buffers of a topology into one shared memory block.
+    Returns the block and the (node_count, edge_count) layout needed to
+    attach to it. The caller owns the block and must unlink it.
+    """
+    node_count = topology.node_count
+    edge_count = topology.edge_count
+
+    buffers = (
+        topology.addresses,
+        topology.offsets,
+        topology.targets,
+        topology.weights,
+        topology.prefix_lengths,
+    )
+    size = sum(len(buffer) * buffer.itemsize for buffer in buffers)
+
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+    offset = 0
+    for buffer in buffers:
+        data = buffer.tobytes()
+        memory.buf[offset : offset + len(data)] = data
+        offset += len(data)
+
+    return memory, (node_count, edge_count)
+
+
+def attach_topology(
+    name: str, layout: tuple[int, int]
+) -> tuple[shared_memory.SharedMemory, CompiledTopology]:
+    """
+    Attach to a block written by share_topology and view it as a
+    CompiledTopology without copying. The id dict is left empty, as the
+    workers only get node IDs.
+    """
+    node_count, edge_count = layout
+    memory = shared_memory.SharedMemory(name=name)
+
+    offset = 0
+
+    def take(count: int, format: str) -> memoryview:
+        nonlocal offset
+        view = memory.buf[offset : offset + count * struct.calcsize(format)]
+        offset += len(view)
+        return view.cast(format)
+
+    topology = CompiledTopology(
+        addresses=take(node_count, "I"),
+        offsets=take(node_count + 1, "I"),
+        targets=take(edge_count, "I"),
+        weights=take(edge_count, "I"),
+        prefix_lengths=take(node_count, "B"),
+    )
+
+    return memory, topology
+
+
+def init_worker(name: str, layout: tuple[int, int]):
+    global worker_memory, worker_topology
+    worker_memory, worker_topology = attach_topology(name, layout)
+
+
+def format_text(src_ip: str, dest_ip: str, path: list[str]) -> bytes:
+    return f"{src_ip:>15s} -> {dest_ip:<15s}  {repr(path)}\n".encode()
+
+
+def format_binary(topology: CompiledTopology, path_ids: list[NodeId]) -> bytes:
+    record = [struct.pack(HOP_COUNT_FORMAT, len(path_ids))]
+    for node in path_ids:
+        address = topology.addresses[node]
+        prefix_length = topology.prefix_lengths[node]
+        record.append(struct.pack(HOP_FORMAT, address, prefix_length))
+    return b"".join(record)
+
+
+def route_group(task) -> list[tuple[int, bytes]]:
+    """
+    Pool task: build one shortest-path tree per source node and format
+    the answer for every pair that starts there.
+    """
+    output_format, groups = task
+    topology = worker_topology
+
+    results = []
+    for source, pairs in groups:
+        _, parent = csr_search(topology, source)
+
+        for index, destination, src_ip, dest_ip in pairs:
+            path = csr_path(parent, destination)
+
+            if output_format == "binary":
+                results.append((index, format_binary(topology, path)))
+            else:
+                names = [topology.node_name(node) for node in path]
+                results.append((index, format_text(src_ip, dest_ip, names)))
+
+    return results
+
+
+def parallel_find_routes(
+    routers: dict,
+    src_dest_pairs,
+    workers: int | None = None,
+    output=None,
+    output_format: str = "text",
+    task_chunk: int = DEFAULT_TASK_CHUNK,
+):
+    """
+    Batch version of find_routes that fans the work out to a process
+    pool.
+
+    The topology is compiled once and placed in shared memory, pairs are
+    grouped by source node (one tree per source), and the groups are
+    sent to the pool task_chunk at a time. Results are written to the
+    binary file object `output` (stdout by default) through a buffered
+    writer, in input order. Pairs with the same router on both ends, or
+    with an endpoint that no router serves, get an empty path.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if output is None:
+        output = sys.stdout.buffer
+
+    topology = compile_topology(routers)
+    prefix_index = PrefixIndex(routers)
+
+    ip_nodes: dict[str, NodeId | None] = {}
+
+    def node_for(ip: str) -> NodeId | None:
+        if ip not in ip_nodes:
+            router = prefix_index.find_router(ip)
+            ip_nodes[ip] = None
+            if router is not None:
+                ip_nodes[ip] = topology.node_id(router, routers[router]["netmask"])
+        return ip_nodes[ip]
+
+    results: list[bytes | None] = []
+    pairs_by_source: dict[NodeId, list] = {}
+
+    for index, (src_ip, dest_ip) in enumerate(src_dest_pairs):
+        source = node_for(src_ip)
+        destination = node_for(dest_ip)
+
+        if source is None or destination is None or source == destination:
+            if output_format == "binary":
+                results.append(format_binary(topology, []))
+            else:
+                results.append(format_text(src_ip, dest_ip, []))
+            continue
+
+        results.append(None)
+        pairs_by_source.setdefault(source, []).append(
+            (index, destination, src_ip, dest_ip)
+        )
+
+    groups = list(pairs_by_source.items())
+    tasks = [
+        (output_format, groups[start : start + task_chunk])
+        for start in range(0, len(groups), task_chunk)
+    ]
+
+    memory, layout = share_topology(topology)
+    try:
+        with multiprocessing.Pool(
+            workers, initializer=init_worker, initargs=(memory.name, layout)
+        ) as pool:
+            for task_results in pool.imap_unordered(route_group, tasks):
+                for index, record in task_results:
+                    results[index] = record
+    finally:
+        memory.close()
+        memory.unlink()
+
+    write_buffered(output, results)
+
+
+def write_buffered(output, records: list[bytes]):
+    """
+    Write records to output in blocks of about OUTPUT_BUFFER_SIZE bytes
+    rather than one write per record.
+    """
+    block: list[bytes] = []
+    block_size = 0
+
+    for record in records:
+        block.append(record)
+        block_size += len(record)
+
+        if block_size >= OUTPUT_BUFFER_SIZE:
+            output.write(b"".join(block))
+            block = []
+            block_size = 0
+
+    output.write(b"".join(block))
+    output.flush()
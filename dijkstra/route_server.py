@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import select
+import signal
+import socket
+import logging
+import threading
+
+from dijkstra import (
+    DEFAULT_ENGINE,
+    TREE_ENGINES,
+    RoutingContext,
+    parse_options,
+    read_routers,
+)
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5050
+
+BUFFER_SIZE = 1 << 16
+ENCODING = "utf-8"
+
+# A client with this much unsent output is not read from until it has
+# taken some of it, so a slow reader can not make the server buffer
+# without bound.
+MAX_PENDING_OUTPUT = 1 << 20
+
+# Same framing as chat/chatcommon.py: a 2-byte big-endian payload length,
+# then that many bytes of JSON.
+LENGTH_BYTES = 2
+MAX_PAYLOAD = (1 << (8 * LENGTH_BYTES)) - 1
+
+
+def frame(message: dict) -> bytes:
+    payload = json.dumps(message).encode(ENCODING)
+
+    if len(payload) > MAX_PAYLOAD:
+        error = {"id": message.get("id"), "error": "response too large"}
+        payload = json.dumps(error).encode(ENCODING)
+
+    return len(payload).to_bytes(LENGTH_BYTES, "big") + payload
+
+
+def split_frames(buffer: bytes) -> tuple[list[dict], bytes]:
+    """
+    Take every complete frame off the front of buffer. Returns the
+    decoded messages and the incomplete rest.
+    """
+    messages = []
+    start = 0
+
+    while len(buffer) - start >= LENGTH_BYTES:
+        payload_length = int.from_bytes(buffer[start : start + LENGTH_BYTES], "big")
+        end = start + LENGTH_BYTES + payload_length
+        if len(buffer) < end:
+            break
+
+        messages.append(json.loads(buffer[start + LENGTH_BYTES : end]))
+        start = end
+
+    return messages, buffer[start:]
+
+
+class RouteServer:
+    """
+    Answer route queries from a topology that is loaded once and kept in
+    memory as a RoutingContext, so shortest-path trees are also shared
+    across queries and clients.
+
+    Clients are multiplexed with select, like chat/chatserver.py. Every
+    frame a client sends is a request, and a client may send many
+    without waiting (pipelining): all the complete frames in a read are
+    answered, in order. Client sockets are non-blocking and every client
+    has its own output buffer, sent as the socket takes it, so a client
+    that reads slowly only holds up itself. Requests are
+
+        {"src": "10.34.46.25", "dest": "10.34.166.25", "id": 1}
+        {"type": "reload"}  (optionally with "file")
+        {"type": "stats"}
+
+    and a route answer is {"src", "dest", "path", "id"}, "id" being
+    echoed back when given. A request that can not be answered gets
+    {"error": ..., "id"} instead, and an address that no router serves
+    gets {"src", "dest", "error", "id"}; neither affects the connection
+    or any other client.
+
+    A reload parses the new file in a background thread while the old
+    context keeps answering, and then swaps the context in one
+    assignment, so no query is dropped or sees a half loaded topology.
+    SIGHUP reloads the current file.
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        engine: str = DEFAULT_ENGINE,
+        tree_cache_size: int | None = None,
+    ):
+        if engine not in TREE_ENGINES:
+            raise ValueError(f"engine must be one of {TREE_ENGINES}")
+
+        self.file_name = file_name
+        self.engine = engine
+        self.tree_cache_size = tree_cache_size
+
+        self.context = self.load(file_name)
+        self.generation = 1
+        self.reload_thread: threading.Thread | None = None
+
+        self.buffers: dict[socket.socket, bytes] = {}
+        self.outputs: dict[socket.socket, bytearray] = {}
+        self.queries = 0
+
+    def load(self, file_name: str) -> RoutingContext:
+        routers = read_routers(file_name)["routers"]
+        return RoutingContext(routers, self.tree_cache_size, self.engine)
+
+    def reload(self, file_name: str | None = None) -> bool:
+        """
+        Start loading file_name (the current file by default) in the
+        background. Returns False if a reload is already running.
+        """
+        if self.reload_thread is not None and self.reload_thread.is_alive():
+            return False
+
+        file_name = file_name or self.file_name
+
+        def run():
+            try:
+                context = self.load(file_name)
+            except (OSError, ValueError, KeyError) as error:
+                logger.error(f"reload of {file_name} failed: {error}")
+                return
+
+            self.context = context
+            self.file_name = file_name
+            self.generation += 1
+            logger.info(f"loaded {file_name} (generation {self.generation})")
+
+        self.reload_thread = threading.Thread(target=run, daemon=True)
+        self.reload_thread.start()
+        return True
+
+    def route(self, src_ip, dest_ip) -> dict:
+        if not isinstance(src_ip, str) or not isinstance(dest_ip, str):
+            return {"error": "bad route request: src and dest must be strings"}
+
+        # one reference per query, so a reload can not swap the context
+        # out from under it
+        context = self.context
+        self.queries += 1
+
+        try:
+            source_node = context.find_node(src_ip)
+            destination_node = context.find_node(dest_ip)
+        except ValueError as error:
+            return {"error": f"bad route request: {error}"}
+
+        response = {"src": src_ip, "dest": dest_ip}
+
+        unresolved = [
+            ip
+            for ip, node in ((src_ip, source_node), (dest_ip, destination_node))
+            if node is None
+        ]
+        if len(unresolved) > 0:
+            response["error"] = f"no router for {', '.join(unresolved)}"
+        else:
+            response["path"] = context.route_nodes(source_node, destination_node)
+
+        return response
+
+    def answer(self, request) -> dict:
+        if not isinstance(request, dict):
+            return {"error": "bad request: not a JSON object"}
+
+        request_type = request.get("type", "route")
+
+        if request_type == "route":
+            response = self.route(request.get("src"), request.get("dest"))
+
+        elif request_type == "reload":
+            file_name = request.get("file")
+            if file_name is None or isinstance(file_name, str):
+                response = {"type": "reload", "started": self.reload(file_name)}
+            else:
+                response = {"error": "bad reload request: file must be a string"}
+
+        elif request_type == "stats":
+            response = {
+                "type": "stats",
+                "file": self.file_name,
+                "generation": self.generation,
+                "queries": self.queries,
+                "clients": len(self.buffers),
+                **self.context.stats(),
+            }
+
+        else:
+            response = {"error": f"unknown request type {request_type}"}
+
+        if "id" in request:
+            response["id"] = request["id"]
+
+        return response
+
+    def safe_answer(self, request) -> dict:
+        """
+        answer, but a request that trips a bug gets an error response
+        (and a log entry) instead of taking the server down.
+        """
+        try:
+            return self.answer(request)
+        except Exception:
+            logger.exception("failed to answer a request")
+
+        response = {"error": "internal error"}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def serve_client(self, sock: socket.socket) -> bool:
+        """
+        Read what the client sent and queue the answer to every complete
+        request. Returns False when the connection is closed.
+        """
+        try:
+            data = sock.recv(BUFFER_SIZE)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+
+        if not data:
+            return False
+
+        try:
+            requests, self.buffers[sock] = split_frames(self.buffers[sock] + data)
+        except (ValueError, RecursionError):
+            logger.warning("malformed frame, closing connection")
+            return False
+
+        for request in requests:
+            self.outputs[sock] += frame(self.safe_answer(request))
+
+        return self.flush(sock)
+
+    def flush(self, sock: socket.socket) -> bool:
+        """
+        Send as much of the client's queued output as the socket takes
+        without blocking. Returns False when the connection is closed.
+        """
+        output = self.outputs[sock]
+        if len(output) == 0:
+            return True
+
+        try:
+            sent = sock.send(output)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+        del output[:sent]
+        return True
+
+    def accept(self, listen_sock: socket.socket):
+        try:
+            client_sock, _ = listen_sock.accept()
+        except OSError as error:
+            logger.warning(f"accept failed: {error}")
+            return
+
+        client_sock.setblocking(False)
+        self.buffers[client_sock] = b""
+        self.outputs[client_sock] = bytearray()
+
+    def disconnect(self, sock: socket.socket):
+        del self.buffers[sock]
+        del self.outputs[sock]
+        sock.close()
+
+    def run(self, listen_sock: socket.socket):
+        listen_sock.listen()
+
+        while True:
+            readers = [
+                sock
+                for sock, output in self.outputs.items()
+                if len(output) < MAX_PENDING_OUTPUT
+            ]
+            writers = [sock for sock, output in self.outputs.items() if len(output) > 0]
+
+            ready_to_read, ready_to_write, _ = select.select(
+                [listen_sock, *readers], writers, []
+            )
+
+            closed = set()
+
+            for sock in ready_to_write:
+                if not self.flush(sock):
+                    closed.add(sock)
+
+            for sock in ready_to_read:
+                if sock is listen_sock:
+                    self.accept(listen_sock)
+                elif sock not in closed and not self.serve_client(sock):
+                    closed.add(sock)
+
+            for sock in closed:
+                self.disconnect(sock)
+
+
+def listen_tcp(host: str, port: int) -> socket.socket:
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def listen_unix(path: str) -> socket.socket:
+    if os.path.exists(path):
+        os.unlink(path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    return sock
+
+
+class RouteClient:
+    """
+    Blocking client for RouteServer, over TCP ((host, port)) or a Unix
+    socket (a path).
+    """
+
+    def __init__(self, address: tuple[str, int] | str):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.buffer = b""
+
+    def close(self):
+        self.sock.close()
+
+    def request_many(self, requests: list[dict]) -> list[dict]:
+        """
+        Send every request before reading any answer (pipelined), and
+        return the answers in order.
+        """
+        self.sock.sendall(b"".join(frame(request) for request in requests))
+
+        responses: list[dict] = []
+        while len(responses) < len(requests):
+            data = self.sock.recv(BUFFER_SIZE)
+            if not data:
+                raise ConnectionError("server closed the connection")
+
+            messages, self.buffer = split_frames(self.buffer + data)
+            responses.extend(messages)
+
+        return responses
+
+    def route(self, src_ip: str, dest_ip: str) -> list[str]:
+        return self.route_many([(src_ip, dest_ip)])[0]
+
+    def route_many(self, src_dest_pairs) -> list[list[str]]:
+        """
+        Paths for every pair, in order. Raises ValueError with the
+        server's message for the first pair it could not route.
+        """
+        requests = [
+            {"src": src_ip, "dest": dest_ip} for src_ip, dest_ip in src_dest_pairs
+        ]
+
+        paths = []
+        for response in self.request_many(requests):
+            if "error" in response:
+                raise ValueError(response["error"])
+            paths.append(response["path"])
+
+        return paths
+
+
+def usage():
+    print(
+        "usage: route_server.py infile.json [--port=N | --unix=PATH] "
+        f"[--host={DEFAULT_HOST}] [--engine={'|'.join(TREE_ENGINES)}] "
+        "[--tree-cache=N]",
+        file=sys.stderr,
+    )
+
+
+def main(argv):
+    positional, options = parse_options(argv)
+
+    try:
+        router_file_name = positional[1]
+        port = int(options.get("port", DEFAULT_PORT))
+        tree_cache_size = None
+        if "tree-cache" in options:
+            tree_cache_size = int(options["tree-cache"])
+    except (IndexError, ValueError):
+        usage()
+        return 1
+
+    engine = options.get("engine", DEFAULT_ENGINE)
+    if tree_cache_size is not None and tree_cache_size < 1:
+        usage()
+        return 1
+    if engine not in TREE_ENGINES:
+        usage()
+        return 1
+
+    logging.basicConfig(
+        format="{asctime} - [{levelname}] {message}",
+        style="{",
+        datefmt="%Y-%m-%d %H:%M",
+        level=logging.INFO,
+    )
+
+    server = RouteServer(router_file_name, engine, tree_cache_size)
+
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: server.reload())
+
+    if "unix" in options:
+        listen_sock = listen_unix(options["unix"])
+        logger.info(f"listening on {options['unix']}...")
+    else:
+        host = options.get("host", DEFAULT_HOST)
+        listen_sock = listen_tcp(host, port)
+        logger.info(f"listening on {host}:{port}...")
+
+    try:
+        server.run(listen_sock)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listen_sock.close()
+        if "unix" in options:
+            os.unlink(options["unix"])
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,234 @@
+import sys
+import math
+import mmap
+import struct
+
+from array import array
+from dataclasses import dataclass
+
+from subnets_and_masks.netfuncs import (
+    get_subnet_mask_value,
+    ipv4_to_value,
+    value_to_ipv4,
+)
+from topology import CompiledTopology, NO_PARENT, NodeId, csr_search
+
+
+# File layout (all arrays in the byte order recorded in the header):
+#
+#   header           HEADER_FORMAT, padded to HEADER_SIZE bytes
+#   addresses        node_count x uint32
+#   prefix_lengths   node_count x uint8, padded to a multiple of 4
+#   next_hops        node_count x node_count x int32 (NO_PARENT = none)
+#   distances        node_count x node_count x uint32 (UNREACHABLE = none)
+#
+# Row `i` of next_hops/distances describes the routes leaving node `i`.
+MAGIC = b"RTBL"
+VERSION = 1
+HEADER_FORMAT = "<4sHBxI"
+HEADER_SIZE = 16
+
+BYTE_ORDERS = {"little": 0, "big": 1}
+
+UNREACHABLE = 0xFFFFFFFF
+
+
+def padded(length: int) -> int:
+    return (length + 3) & ~3
+
+
+@dataclass
+class RoutingTable:
+    """
+    All-pairs routing table: for every (source, destination) node pair,
+    the first hop to take from the source and the total distance.
+
+    The buffers are either arrays (freshly built) or memoryviews over an
+    mmap of a saved table; both index the same way.
+    """
+
+    node_count: int
+    addresses: array | memoryview
+    prefix_lengths: array | memoryview
+    next_hops: array | memoryview
+    distances: array | memoryview
+
+    def __post_init__(self):
+        # network value -> node id, one dict per prefix length, longest
+        # prefix first. Used to resolve endpoint IPs without the JSON.
+        networks: dict[int, dict[int, NodeId]] = {}
+
+        for node in range(self.node_count):
+            prefix_length = self.prefix_lengths[node]
+            netmask = get_subnet_mask_value(f"/{prefix_length}")
+            network = self.addresses[node] & netmask
+
+            networks.setdefault(prefix_length, {}).setdefault(network, node)
+
+        self.networks = sorted(
+            networks.items(), key=lambda item: item[0], reverse=True
+        )
+
+    def node_name(self, node: NodeId) -> str:
+        return f"{value_to_ipv4(self.addresses[node])}/{self.prefix_lengths[node]}"
+
+    def find_node(self, ip: str) -> NodeId | None:
+        ip_value = ipv4_to_value(ip)
+
+        for prefix_length, nodes in self.networks:
+            netmask = get_subnet_mask_value(f"/{prefix_length}")
+            node = nodes.get(ip_value & netmask)
+            if node is not None:
+                return node
+
+        return None
+
+    def next_hop(self, source: NodeId, destination: NodeId) -> NodeId:
+        return self.next_hops[source * self.node_count + destination]
+
+    def distance(self, source: NodeId, destination: NodeId) -> float:
+        distance = self.distances[source * self.node_count + destination]
+        return math.inf if distance == UNREACHABLE else distance
+
+    def route(self, source: NodeId, destination: NodeId) -> list[str]:
+        """
+        Walk the table hop by hop from source to destination and return
+        the node names, both ends included, like reconstruct_path. An
+        unreachable destination gives just [destination].
+        """
+        if self.next_hop(source, destination) == NO_PARENT:
+            return [self.node_name(destination)]
+
+        path = [self.node_name(source)]
+
+        current_node = source
+        for _ in range(self.node_count):
+            if current_node == destination:
+                return path
+
+            current_node = self.next_hop(current_node, destination)
+            path.append(self.node_name(current_node))
+
+        raise ValueError("routing table has a forwarding loop")
+
+    def route_ips(self, src_ip: str, dest_ip: str) -> list[str]:
+        source = self.find_node(src_ip)
+        destination = self.find_node(dest_ip)
+
+        if source is None or destination is None:
+            return []
+        if source == destination:
+            return []
+
+        return self.route(source, destination)
+
+
+def first_hops(parent: array, source: NodeId) -> array:
+    """
+    Turn one shortest-path tree (a csr_search parent array) into the
+    first hop out of source towards every node.
+    """
+    hops = array("i", [NO_PARENT]) * len(parent)
+    hops[source] = source
+
+    for node in range(len(parent)):
+        # climb until we reach a node whose first hop is known, or a
+        # child of the source, then fill in the hop on the way back.
+        stack = []
+        current_node = node
+        while hops[current_node] == NO_PARENT and parent[current_node] != NO_PARENT:
+            stack.append(current_node)
+            if parent[current_node] == source:
+                break
+            current_node = parent[current_node]
+
+        if not stack:
+            continue
+
+        if parent[stack[-1]] == source:
+            hop = stack[-1]
+        else:
+            hop = hops[current_node]
+
+        for child in stack:
+            hops[child] = hop
+
+    return hops
+
+
+def build_routing_table(topology: CompiledTopology) -> RoutingTable:
+    """
+    Run one full heap Dijkstra per node and collect the first hops and
+    distances into node_count x node_count tables. Meant for topologies
+    of up to a few thousand routers: the tables grow quadratically.
+    """
+    node_count = topology.node_count
+
+    next_hops = array("i")
+    distances = array("I")
+
+    for source in range(node_count):
+        row_distances, parent = csr_search(topology, source)
+
+        next_hops.extend(first_hops(parent, source))
+        distances.extend(
+            UNREACHABLE if distance == math.inf else distance
+            for distance in row_distances
+        )
+
+    return RoutingTable(
+        node_count,
+        array("I", topology.addresses),
+        array("B", topology.prefix_lengths),
+        next_hops,
+        distances,
+    )
+
+
+def save_routing_table(table: RoutingTable, file_name: str):
+    header = struct.pack(
+        HEADER_FORMAT, MAGIC, VERSION, BYTE_ORDERS[sys.byteorder], table.node_count
+    )
+
+    prefix_lengths = bytes(table.prefix_lengths)
+
+    with open(file_name, "wb") as fp:
+        fp.write(header.ljust(HEADER_SIZE, b"\x00"))
+        fp.write(bytes(table.addresses))
+        fp.write(prefix_lengths.ljust(padded(len(prefix_lengths)), b"\x00"))
+        fp.write(bytes(table.next_hops))
+        fp.write(bytes(table.distances))
+
+
+def load_routing_table(file_name: str) -> RoutingTable:
+    """
+    Map a table written by save_routing_table. Nothing is copied: the
+    returned table reads straight from the mapped file.
+    """
+    with open(file_name, "rb") as fp:
+        mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, byte_order, node_count = struct.unpack_from(
+        HEADER_FORMAT, mapping
+    )
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{file_name} is not a version {VERSION} routing table")
+    if byte_order != BYTE_ORDERS[sys.byteorder]:
+        raise ValueError(f"{file_name} was written with a different byte order")
+
+    view = memoryview(mapping)
+    offset = HEADER_SIZE
+
+    def take(length: int, format: str) -> memoryview:
+        nonlocal offset
+        buffer = view[offset : offset + length].cast(format)
+        offset += padded(length)
+        return buffer
+
+    addresses = take(node_count * 4, "I")
+    prefix_lengths = take(node_count, "B")
+    next_hops = take(node_count * node_count * 4, "i")
+    distances = take(node_count * node_count * 4, "I")
+
+    return RoutingTable(node_count, addresses, prefix_lengths, next_hops, distances)
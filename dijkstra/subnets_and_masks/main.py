@@ -1,4 +1,10 @@
+import heapq
+
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
 from functools import reduce
+from itertools import islice
 from dataclasses import dataclass
 
 
@@ -43,6 +49,176 @@ def get_subnet(ip: str) -> IpInfo:
     )
 
 
+def get_range(cidr: str) -> tuple[int, int]:
+    """
+    First and last address of a CIDR block, as numbers.
+    """
+    simple_ip, subnet_mask_number = cidr.split("/")
+    subnet_mask = get_subnet_mask(int(subnet_mask_number))
+
+    network = from_dan(simple_ip) & subnet_mask
+    return network, network | (~subnet_mask & 0xFFFFFFFF)
+
+
+def iter_hosts(cidr: str) -> Iterator[str]:
+    """
+    Lazily yield the usable host addresses of a subnet (everything but
+    the network and broadcast address; /31 and /32 yield every address).
+    """
+    first, last = get_range(cidr)
+    if last - first >= 2:
+        first, last = first + 1, last - 1
+
+    return map(to_dan, range(first, last + 1))
+
+
+def iter_subnets(cidr: str, new_slash: int) -> Iterator[str]:
+    """
+    Lazily yield the /new_slash subnets that make up a subnet.
+    """
+    first, last = get_range(cidr)
+    if new_slash < int(cidr.split("/")[1]) or new_slash > 32:
+        raise ValueError("Invalid subnet mask")
+
+    step = 1 << (32 - new_slash)
+    for network in range(first, last + 1, step):
+        yield f"{to_dan(network)}/{new_slash}"
+
+
+def merge_ranges(ranges: Iterable[tuple[int, int]]) -> tuple[array, array]:
+    """
+    Merge sorted (first, last) ranges that overlap or touch, returning
+    the parallel starts/ends arrays of the disjoint result.
+    """
+    starts = array("I")
+    ends = array("I")
+
+    for first, last in ranges:
+        if len(ends) > 0 and first <= ends[-1] + 1:
+            if last > ends[-1]:
+                ends[-1] = last
+            continue
+
+        starts.append(first)
+        ends.append(last)
+
+    return starts, ends
+
+
+class IpRangeSet:
+    """
+    A set of IPv4 addresses stored as sorted, disjoint, inclusive
+    ranges in two parallel arrays (8 bytes per range, whatever the
+    range size).
+
+    Membership is a bisect over the starts, so O(log n). Union,
+    intersection and difference walk both sets once, O(n + m).
+    """
+
+    def __init__(self, ranges: Iterable[tuple[int, int]] = ()):
+        self.starts, self.ends = merge_ranges(sorted(ranges))
+
+    @classmethod
+    def from_cidrs(cls, cidrs: Iterable[str]) -> "IpRangeSet":
+        return cls(map(get_range, cidrs))
+
+    @classmethod
+    def from_sorted(cls, ranges: Iterable[tuple[int, int]]) -> "IpRangeSet":
+        range_set = cls()
+        range_set.starts, range_set.ends = merge_ranges(ranges)
+        return range_set
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, IpRangeSet):
+            return NotImplemented
+        return self.starts == other.starts and self.ends == other.ends
+
+    def __contains__(self, ip: str | int) -> bool:
+        if isinstance(ip, str):
+            ip = from_dan(ip)
+
+        index = bisect_right(self.starts, ip) - 1
+        return index >= 0 and ip <= self.ends[index]
+
+    def address_count(self) -> int:
+        return sum(last - first + 1 for first, last in self)
+
+    def union(self, other: "IpRangeSet") -> "IpRangeSet":
+        return IpRangeSet.from_sorted(heapq.merge(self, other))
+
+    def intersection(self, other: "IpRangeSet") -> "IpRangeSet":
+        ranges = []
+        mine, theirs = list(self), list(other)
+        i = j = 0
+
+        while i < len(mine) and j < len(theirs):
+            first = max(mine[i][0], theirs[j][0])
+            last = min(mine[i][1], theirs[j][1])
+            if first <= last:
+                ranges.append((first, last))
+
+            # drop whichever range ends first
+            if mine[i][1] < theirs[j][1]:
+                i += 1
+            else:
+                j += 1
+
+        return IpRangeSet.from_sorted(ranges)
+
+    def difference(self, other: "IpRangeSet") -> "IpRangeSet":
+        ranges = []
+        theirs = list(other)
+        j = 0
+
+        for first, last in self:
+            # skip the ranges of other that end before this one starts
+            while j < len(theirs) and theirs[j][1] < first:
+                j += 1
+
+            k = j
+            while k < len(theirs) and theirs[k][0] <= last:
+                if theirs[k][0] > first:
+                    ranges.append((first, theirs[k][0] - 1))
+                first = max(first, theirs[k][1] + 1)
+                k += 1
+
+            if first <= last:
+                ranges.append((first, last))
+
+        return IpRangeSet.from_sorted(ranges)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def hosts(self) -> Iterator[str]:
+        """
+        Lazily yield every address in the set, in order.
+        """
+        for first, last in self:
+            yield from map(to_dan, range(first, last + 1))
+
+    def cidrs(self) -> Iterator[str]:
+        """
+        Lazily yield the fewest CIDR blocks that cover the set exactly.
+        """
+        for first, last in self:
+            while first <= last:
+                # largest aligned block that starts at first and fits
+                size = first & -first if first else 1 << 32
+                while size > last - first + 1:
+                    size >>= 1
+
+                yield f"{to_dan(first)}/{32 - size.bit_length() + 1}"
+                first += size
+
+
 def test_dan(ip: str):
     number = from_dan(ip)
     string_again = to_dan(number)
@@ -70,6 +246,13 @@ def main():
 
     print(hex((0x12FF5678 >> 16) & 0xFF))
 
+    ranges = IpRangeSet.from_cidrs(["10.0.0.0/8", "192.168.1.0/24"])
+    ranges = ranges - IpRangeSet.from_cidrs(["10.128.0.0/9"])
+    print("10.1.2.3 in ranges:", "10.1.2.3" in ranges)
+    print("10.200.0.1 in ranges:", "10.200.0.1" in ranges)
+    print("ranges as cidrs:", list(ranges.cidrs()))
+    print("first hosts of 10.0.0.0/8:", list(islice(iter_hosts("10.0.0.0/8"), 3)))
+
 
 if __name__ == "__main__":
 
@@ -1,7 +1,14 @@
 import sys
 import json
+import mmap
+import socket
 
-from functools import reduce
+from array import array
+from bisect import insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from collections.abc import Iterable, Iterator
+from functools import partial, reduce
 
 
 def ipv4_to_value(ipv4_addr: str) -> int:
@@ -167,6 +174,744 @@ def find_router_for_ip(routers: dict, ip: str):
     return None
 
 
+# Bulk versions of the functions above. They work on array("I") buffers
+# of 32-bit values and push the per-address work into C: socket.inet_pton
+# and a single %-format for the string conversions, and one big-integer
+# AND over the whole buffer for the masking.
+
+IPV4_ARRAY_TYPE = "I"
+
+# netmask value for every slash length, /0 to /32
+SUBNET_MASK_VALUES = [((1 << slash) - 1) << (32 - slash) for slash in range(33)]
+
+
+def ipv4_to_packed(ipv4_addr: str) -> bytes:
+    """
+    ipv4_to_value as 4 bytes in network order. Raises ValueError if the
+    address does not parse or does not fit in 32 bits.
+    """
+    try:
+        return ipv4_to_value(ipv4_addr).to_bytes(4, "big")
+    except OverflowError:
+        raise ValueError(f"not an IPv4 address: {ipv4_addr!r}") from None
+
+
+def ipv4s_to_values(ipv4_addrs: Iterable[str]) -> array:
+    """
+    Bulk ipv4_to_value: convert dots-and-numbers addresses to an
+    array("I") of 32-bit values. Raises ValueError if an address does
+    not parse.
+
+    inet_pton only takes the strict four-decimal form. A chunk that has
+    anything else (zero-padded octets, fewer than four parts) goes
+    through ipv4_to_value one address at a time, so every address gets
+    the same value as from ipv4_to_value. inet_aton would read
+    "010.034.046.025" as octal and "10.34.46" as 10.34.0.46.
+
+    Example:
+
+    ipv4_addrs: ["255.255.0.0", "1.2.3.4"]
+    return:     array("I", [4294901760, 16909060])
+
+    ipv4_addrs: ["010.034.046.025", "10.34.46"]
+    return:     array("I", [170012185, 170012160])
+    """
+    ipv4_addrs = list(ipv4_addrs)
+
+    try:
+        packed = b"".join(map(partial(socket.inet_pton, socket.AF_INET), ipv4_addrs))
+    except OSError:
+        packed = b"".join(map(ipv4_to_packed, ipv4_addrs))
+
+    values = array(IPV4_ARRAY_TYPE, packed)
+
+    # both give network (big-endian) byte order
+    if sys.byteorder == "little":
+        values.byteswap()
+
+    return values
+
+
+def as_ipv4_values(addrs) -> array:
+    """
+    Accept an array("I"), a sequence of integer values or a sequence of
+    dots-and-numbers strings, and return an array("I") of values.
+    """
+    if isinstance(addrs, array) and addrs.typecode == IPV4_ARRAY_TYPE:
+        return addrs
+
+    addrs = list(addrs)
+    if len(addrs) > 0 and isinstance(addrs[0], str):
+        return ipv4s_to_values(addrs)
+
+    return array(IPV4_ARRAY_TYPE, addrs)
+
+
+def values_to_ipv4s(addrs) -> list[str]:
+    """
+    Bulk value_to_ipv4: convert 32-bit values to dots-and-numbers
+    strings.
+
+    Example:
+
+    addrs:  [0xffff0000, 0x01020304]
+    return: ["255.255.0.0", "1.2.3.4"]
+    """
+    values = array(IPV4_ARRAY_TYPE, as_ipv4_values(addrs))
+    if len(values) == 0:
+        return []
+
+    if sys.byteorder == "little":
+        values.byteswap()
+
+    # one %-format over every octet, then split per address
+    text = ("%d.%d.%d.%d\n" * len(values)) % tuple(values.tobytes())
+    return text.split("\n")[:-1]
+
+
+def get_subnet_mask_values(slashes: Iterable[str]) -> array:
+    """
+    Bulk get_subnet_mask_value: one netmask value per slash string.
+    """
+    return array(
+        IPV4_ARRAY_TYPE,
+        (SUBNET_MASK_VALUES[int(slash.split("/")[-1])] for slash in slashes),
+    )
+
+
+def mask_values(values: array, netmasks: int | array) -> array:
+    """
+    AND every value with a netmask (one for all, or one per value),
+    treating both buffers as one big integer so the loop runs in C.
+    """
+    if isinstance(netmasks, int):
+        mask_bytes = array(IPV4_ARRAY_TYPE, [netmasks]).tobytes() * len(values)
+    else:
+        mask_bytes = as_ipv4_values(netmasks).tobytes()
+
+    value_bytes = values.tobytes()
+    if len(mask_bytes) != len(value_bytes):
+        raise ValueError("need one netmask per address")
+
+    masked = int.from_bytes(value_bytes, sys.byteorder) & int.from_bytes(
+        mask_bytes, sys.byteorder
+    )
+
+    return array(IPV4_ARRAY_TYPE, masked.to_bytes(len(value_bytes), sys.byteorder))
+
+
+def get_networks(addrs, netmasks: int | array) -> array:
+    """
+    Bulk get_network: the network part of every address. addrs can be
+    anything as_ipv4_values accepts; netmasks is a single netmask value
+    or one value per address.
+    """
+    return mask_values(as_ipv4_values(addrs), netmasks)
+
+
+def get_host_parts(addrs, netmasks: int | array) -> array:
+    """
+    The host part of every address (the bits the netmask clears).
+    """
+    if isinstance(netmasks, int):
+        host_masks = ~netmasks & 0xFFFFFFFF
+    else:
+        host_masks = array(
+            IPV4_ARRAY_TYPE,
+            (~netmask & 0xFFFFFFFF for netmask in as_ipv4_values(netmasks)),
+        )
+
+    return mask_values(as_ipv4_values(addrs), host_masks)
+
+
+# A router in a PrefixIndex subnet: (sequence number, router IP). The
+# lowest sequence number, the router added first, wins.
+Candidate = tuple[int, str]
+
+
+class PrefixIndex:
+    """
+    Longest-prefix-match index over the router subnets, built once from
+    a routers dictionary and then queried many times.
+
+    There is one hash table per distinct prefix length, mapping network
+    value -> routers in that subnet, probed from the longest prefix to
+    the shortest. That is at most 33 probes, and router inventories
+    usually only have a handful of prefix lengths. Unlike
+    find_router_for_ip, which returns the first router in dictionary
+    order, this returns the most specific one; when two routers share
+    the exact same subnet the first one added wins.
+
+    Routers can be added, re-masked and removed after the index is
+    built; a re-masked router keeps its place in the lookup order.
+    """
+
+    def __init__(self, routers: dict | None = None):
+        # prefix length -> network value -> candidates, in lookup order
+        self.networks: dict[int, dict[int, list[Candidate]]] = {}
+        # (prefix length, netmask, networks) longest first
+        self.levels: list[tuple[int, int, dict[int, list[Candidate]]]] = []
+
+        # router IP -> (sequence number, address value, prefix length)
+        self.entries: dict[str, tuple[int, int, int]] = {}
+        self.next_sequence = 0
+
+        if routers is not None:
+            for router_ip, router_info in routers.items():
+                self.add(router_ip, router_info["netmask"])
+
+    def __len__(self) -> int:
+        return sum(len(networks) for networks in self.networks.values())
+
+    def __contains__(self, router_ip: str) -> bool:
+        return router_ip in self.entries
+
+    def netmask_value(self, router_ip: str) -> int:
+        return SUBNET_MASK_VALUES[self.entries[router_ip][2]]
+
+    def network_value(self, router_ip: str) -> int:
+        _, ip_value, prefix_length = self.entries[router_ip]
+        return get_network(ip_value, SUBNET_MASK_VALUES[prefix_length])
+
+    def add(self, router_ip: str, slash: str):
+        """
+        Add a router, or re-mask one that is already there.
+        """
+        prefix_length = int(slash.split("/")[-1])
+        if prefix_length < 0 or prefix_length > 32:
+            raise ValueError("Invalid subnet mask")
+
+        if router_ip in self.entries:
+            sequence = self.entries[router_ip][0]
+            self.remove(router_ip)
+        else:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+
+        ip_value = ipv4_to_value(router_ip)
+        self.entries[router_ip] = (sequence, ip_value, prefix_length)
+
+        network = get_network(ip_value, SUBNET_MASK_VALUES[prefix_length])
+        self.insert(network, prefix_length, (sequence, router_ip))
+
+    def add_prefix(self, network: int, prefix_length: int, router_ip: str):
+        """
+        Add an already masked network value, e.g. one that came out of
+        aggregate_prefixes. Unlike a router added with add, it can not
+        be removed.
+        """
+        self.insert(network, prefix_length, (self.next_sequence, router_ip))
+        self.next_sequence += 1
+
+    def remove(self, router_ip: str):
+        sequence, ip_value, prefix_length = self.entries.pop(router_ip)
+        network = get_network(ip_value, SUBNET_MASK_VALUES[prefix_length])
+        self.delete(network, prefix_length, (sequence, router_ip))
+
+    def insert(self, network: int, prefix_length: int, candidate: Candidate):
+        if prefix_length not in self.networks:
+            self.networks[prefix_length] = {}
+            self.levels = [
+                (length, SUBNET_MASK_VALUES[length], self.networks[length])
+                for length in sorted(self.networks, reverse=True)
+            ]
+
+        insort(self.networks[prefix_length].setdefault(network, []), candidate)
+
+    def delete(self, network: int, prefix_length: int, candidate: Candidate):
+        networks = self.networks[prefix_length]
+        networks[network].remove(candidate)
+        if len(networks[network]) == 0:
+            del networks[network]
+
+    def find_router_for_value(self, ip_value: int) -> str | None:
+        for _, netmask, networks in self.levels:
+            candidates = networks.get(ip_value & netmask)
+            if candidates:
+                return candidates[0][1]
+
+        return None
+
+    def find_router(self, ip: str) -> str | None:
+        return self.find_router_for_value(ipv4_to_value(ip))
+
+    def find_routers_for_values(self, values: array) -> list[str | None]:
+        """
+        Bulk lookup: mask every still unmatched value with one prefix
+        length at a time (get_networks) and look the networks up with a
+        C-level map over the hash table.
+        """
+        routers: list[str | None] = [None] * len(values)
+        pending = list(range(len(values)))
+
+        for _, netmask, networks in self.levels:
+            if len(pending) == 0:
+                break
+
+            matches = map(networks.get, mask_values(values, netmask))
+
+            still_pending = []
+            pending_values = []
+            for index, value, candidates in zip(pending, values, matches):
+                if candidates:
+                    routers[index] = candidates[0][1]
+                else:
+                    still_pending.append(index)
+                    pending_values.append(value)
+
+            pending = still_pending
+            values = array(IPV4_ARRAY_TYPE, pending_values)
+
+        return routers
+
+
+DEFAULT_ROUTER_CACHE_SIZE = 4096
+
+
+class RouterTable(PrefixIndex):
+    """
+    A PrefixIndex that keeps recent answers in a bounded LRU cache keyed
+    by the address string, so a hot address is one dict lookup without
+    any parsing.
+
+    Adding, removing or re-masking a router only drops the cached
+    answers for addresses inside its old or new subnet; everything else
+    stays cached.
+    """
+
+    def __init__(
+        self, routers: dict | None = None, cache_size: int = DEFAULT_ROUTER_CACHE_SIZE
+    ):
+        if cache_size < 1:
+            raise ValueError("cache_size must be at least 1")
+
+        self.cache_size = cache_size
+
+        # address -> (address value, router IP)
+        self.cache: OrderedDict[str, tuple[int, str | None]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        super().__init__(routers)
+
+    def insert(self, network: int, prefix_length: int, candidate: Candidate):
+        super().insert(network, prefix_length, candidate)
+        self.invalidate(network, SUBNET_MASK_VALUES[prefix_length])
+
+    def delete(self, network: int, prefix_length: int, candidate: Candidate):
+        super().delete(network, prefix_length, candidate)
+        self.invalidate(network, SUBNET_MASK_VALUES[prefix_length])
+
+    def invalidate(self, network: int, netmask: int):
+        """
+        Drop the cached answers for every address inside the subnet.
+        """
+        if len(self.cache) == 0:
+            return
+
+        stale = [
+            ip
+            for ip, (ip_value, _) in self.cache.items()
+            if get_network(ip_value, netmask) == network
+        ]
+        for ip in stale:
+            del self.cache[ip]
+
+    def find_router(self, ip: str) -> str | None:
+        cached = self.cache.get(ip)
+
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(ip)
+            return cached[1]
+
+        self.misses += 1
+        ip_value = ipv4_to_value(ip)
+        router_ip = self.find_router_for_value(ip_value)
+
+        self.cache[ip] = (ip_value, router_ip)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return router_ip
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_addresses": len(self.cache),
+            "cache_size": self.cache_size,
+        }
+
+
+# A router prefix: (network value, prefix length, router IP)
+Prefix = tuple[int, int, str]
+
+
+@dataclass
+class AggregationReport:
+    original_count: int
+    aggregated_count: int
+
+    @property
+    def reduction_ratio(self) -> float:
+        """
+        Fraction of the prefixes that aggregation removed.
+        """
+        if self.original_count == 0:
+            return 0.0
+        return 1 - self.aggregated_count / self.original_count
+
+
+def prefixes_from_routers(routers: dict) -> list[Prefix]:
+    return [
+        (
+            get_network(
+                ipv4_to_value(router_ip),
+                get_subnet_mask_value(router_info["netmask"]),
+            ),
+            int(router_info["netmask"].split("/")[-1]),
+            router_ip,
+        )
+        for router_ip, router_info in routers.items()
+    ]
+
+
+def prefix_from_cidr(cidr: str, router_ip: str) -> Prefix:
+    """
+    "10.20.30.40/23", "10.0.0.1" -> (network of 10.20.30.40/23, 23, "10.0.0.1")
+    """
+    ip, _, slash = cidr.partition("/")
+    netmask = get_subnet_mask_value(slash)
+    return get_network(ipv4_to_value(ip), netmask), int(slash), router_ip
+
+
+def aggregate_prefixes(prefixes: Iterable[Prefix]) -> list[Prefix]:
+    """
+    Shrink a prefix -> router table without changing the router that a
+    longest-prefix-match lookup (PrefixIndex) returns for any address.
+
+    1. Duplicate prefixes keep their first router, as in PrefixIndex.
+    2. Sibling prefixes (the two halves of a /n-1) with the same router
+       are merged into their parent, longest prefixes first so merges
+       cascade upwards. A parent that was already in the table is fully
+       shadowed by its two halves, so it just takes over their router.
+    3. A prefix is dropped when the nearest prefix covering it maps to
+       the same router, found with one sorted pass and a stack of the
+       currently open covering prefixes.
+
+    Step 2 is O(32 n) dictionary work and step 3 a sort, so the whole is
+    O(n log n). The result has no mergeable siblings and no redundant
+    nested prefixes, returned sorted by (network, prefix length).
+    """
+    levels: list[dict[int, str]] = [{} for _ in range(33)]
+    for network, prefix_length, router_ip in prefixes:
+        levels[prefix_length].setdefault(network, router_ip)
+
+    for prefix_length in range(32, 0, -1):
+        level = levels[prefix_length]
+        half_size = 1 << (32 - prefix_length)
+
+        for network in list(level.keys()):
+            if network & half_size or network not in level:
+                continue
+
+            router_ip = level[network]
+            if level.get(network | half_size) != router_ip:
+                continue
+
+            del level[network]
+            del level[network | half_size]
+            levels[prefix_length - 1][network] = router_ip
+
+    aggregated: list[Prefix] = []
+    # covering prefixes as (network, last address, router)
+    covering: list[tuple[int, int, str]] = []
+
+    for network, prefix_length, router_ip in sorted(
+        (network, prefix_length, router_ip)
+        for prefix_length, level in enumerate(levels)
+        for network, router_ip in level.items()
+    ):
+        while len(covering) > 0 and covering[-1][1] < network:
+            covering.pop()
+
+        if len(covering) > 0 and covering[-1][2] == router_ip:
+            continue
+
+        aggregated.append((network, prefix_length, router_ip))
+        last_address = network | (~SUBNET_MASK_VALUES[prefix_length] & 0xFFFFFFFF)
+        covering.append((network, last_address, router_ip))
+
+    return aggregated
+
+
+def aggregate_routers(routers: dict) -> tuple[list[Prefix], AggregationReport]:
+    """
+    aggregate_prefixes over the subnets of a routers dictionary, with a
+    report of how much smaller the table got.
+    """
+    prefixes = prefixes_from_routers(routers)
+    aggregated = aggregate_prefixes(prefixes)
+
+    return aggregated, AggregationReport(len(prefixes), len(aggregated))
+
+
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Sections of the topology JSON that stream_topology yields item by item
+# instead of as one value.
+STREAMED_SECTIONS = ("routers", "src-dest")
+
+
+class JsonStream:
+    """
+    Pull JSON values out of a text file one at a time.
+
+    Only a window of the file is held in memory: values are decoded with
+    json.JSONDecoder.raw_decode at the current position, and the buffer
+    is refilled (dropping what was already consumed) whenever a value
+    runs past its end.
+    """
+
+    def __init__(self, fp, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming
+        it, or "" at the end of the file.
+        """
+        while True:
+            while self.position < len(self.buffer):
+                if not self.buffer[self.position].isspace():
+                    return self.buffer[self.position]
+                self.position += 1
+
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} in JSON stream, found {found!r}")
+        self.position += 1
+
+    def skip(self, char: str) -> bool:
+        if self.peek() != char:
+            return False
+        self.position += 1
+        return True
+
+    def value(self):
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+
+            # a number right at the end of the window may be cut short
+            if end == len(self.buffer) and self.fill():
+                continue
+
+            self.position = end
+            return value
+
+
+def stream_topology(
+    file_name: str, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[tuple[str, object]]:
+    """
+    Read a topology file like read_routers does, but lazily.
+
+    Yields ("routers", (router_ip, router_info)) for every router,
+    ("src-dest", [src_ip, dest_ip]) for every pair, and (key, value) for
+    any other top-level key, in file order. Memory use is bounded by the
+    largest single router entry, not by the file size.
+    """
+    with open(file_name) as fp:
+        stream = JsonStream(fp, chunk_size)
+        stream.expect("{")
+
+        while not stream.skip("}"):
+            key = stream.value()
+            stream.expect(":")
+
+            if key == "routers":
+                stream.expect("{")
+                while not stream.skip("}"):
+                    router = stream.value()
+                    stream.expect(":")
+                    yield key, (router, stream.value())
+                    stream.skip(",")
+            elif key == "src-dest":
+                stream.expect("[")
+                while not stream.skip("]"):
+                    yield key, stream.value()
+                    stream.skip(",")
+            else:
+                yield key, stream.value()
+
+            stream.skip(",")
+
+
+CLASSIFY_CHUNK_SIZE = 1 << 20
+
+
+def iter_address_chunks(
+    file_name: str, chunk_size: int = CLASSIFY_CHUNK_SIZE
+) -> Iterator[list[str]]:
+    """
+    Yield the addresses of a one-address-per-line file in lists of about
+    chunk_size bytes worth of lines. "-" reads stdin. Files are mapped
+    with mmap, so only the current chunk is ever copied into memory.
+    Blank lines are skipped. Bytes that are not ASCII come out as U+FFFD,
+    so such a line is still yielded and fails to parse as an address.
+    """
+
+    def split(data: bytes) -> list[str]:
+        return data.decode("ascii", errors="replace").split()
+
+    if file_name == "-":
+        rest = b""
+        while True:
+            data = sys.stdin.buffer.read(chunk_size)
+            if not data:
+                break
+
+            data = rest + data
+            end = data.rfind(b"\n") + 1
+            rest = data[end:]
+            yield split(data[:end])
+
+        if rest:
+            yield split(rest)
+        return
+
+    with open(file_name, "rb") as fp:
+        size = fp.seek(0, 2)
+        if size == 0:
+            return
+
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    newline = mapping.rfind(b"\n", start, end)
+                    if newline >= start:
+                        end = newline + 1
+                    else:
+                        end = mapping.find(b"\n", end)
+                        end = size if end < 0 else end + 1
+
+                yield split(mapping[start:end])
+                start = end
+
+
+def classify_addresses(
+    prefix_index: PrefixIndex, addresses: list[str]
+) -> list[str | None]:
+    """
+    Router for every address in a chunk (None if no router matches or
+    the address does not parse).
+    """
+    try:
+        values = ipv4s_to_values(addresses)
+    except ValueError:
+        # a malformed line somewhere in the chunk: go one by one
+        routers = []
+        for address in addresses:
+            try:
+                value = ipv4s_to_values([address])[0]
+            except ValueError:
+                routers.append(None)
+                continue
+            routers.append(prefix_index.find_router_for_value(value))
+        return routers
+
+    return prefix_index.find_routers_for_values(values)
+
+
+def classify_stream(
+    prefix_index: PrefixIndex,
+    file_name: str,
+    assign: bool = False,
+    output=None,
+    chunk_size: int = CLASSIFY_CHUNK_SIZE,
+) -> dict[str, int]:
+    """
+    Classify every address of a file (or stdin, "-") against the router
+    subnets, one chunk at a time.
+
+    Returns the number of addresses per router ("None" for unmatched
+    ones). With assign, also writes "address router" lines to output
+    (stdout by default) as each chunk is done.
+    """
+    if output is None:
+        output = sys.stdout
+
+    counts: dict[str, int] = {}
+
+    for addresses in iter_address_chunks(file_name, chunk_size):
+        routers = classify_addresses(prefix_index, addresses)
+
+        for router_ip in routers:
+            key = str(router_ip)
+            counts[key] = counts.get(key, 0) + 1
+
+        if assign:
+            output.write(
+                "".join(
+                    f"{address} {router_ip}\n"
+                    for address, router_ip in zip(addresses, routers)
+                )
+            )
+
+    return counts
+
+
+def parse_options(argv: list[str]) -> tuple[list[str], dict[str, str]]:
+    """
+    Split argv into positional arguments and "--key=value" options.
+    A bare "--flag" is stored with the value "true".
+    """
+    positional: list[str] = []
+    options: dict[str, str] = {}
+
+    for argument in argv:
+        if argument.startswith("--"):
+            key, _, value = argument[2:].partition("=")
+            options[key] = value if value else "true"
+        else:
+            positional.append(argument)
+
+    return positional, options
+
+
 # Uncomment this code to have it run instead of the real main.
 # Be sure to comment it back out before you submit!
 """
@@ -188,7 +933,10 @@ def my_tests():
 
 
 def usage():
-    print("usage: netfuncs.py infile.json", file=sys.stderr)
+    print(
+        "usage: netfuncs.py infile.json [--classify=addresses.txt|- [--assign]]",
+        file=sys.stderr,
+    )
 
 
 def read_routers(file_name):
@@ -202,18 +950,15 @@ def print_routers(routers):
     print("Routers:")
 
     routers_list = sorted(routers.keys())
+    router_table = RouterTable(routers)
 
     for router_ip in routers_list:
 
         # Get the netmask
-        slash_mask = routers[router_ip]["netmask"]
-        netmask_value = get_subnet_mask_value(slash_mask)
-        netmask = value_to_ipv4(netmask_value)
+        netmask = value_to_ipv4(router_table.netmask_value(router_ip))
 
         # Get the network number
-        router_ip_value = ipv4_to_value(router_ip)
-        network_value = get_network(router_ip_value, netmask_value)
-        network_ip = value_to_ipv4(network_value)
+        network_ip = value_to_ipv4(router_table.network_value(router_ip))
 
         print(f" {router_ip:>15s}: netmask {netmask}: " f"network {network_ip}")
 
@@ -238,9 +983,10 @@ def print_ip_routers(routers, src_dest_pairs):
     all_ips = sorted(set([i for pair in src_dest_pairs for i in pair]))
 
     router_host_map = {}
+    prefix_index = PrefixIndex(routers)
 
     for ip in all_ips:
-        router = str(find_router_for_ip(routers, ip))
+        router = str(prefix_index.find_router(ip))
 
         if router not in router_host_map:
             router_host_map[router] = []
@@ -256,12 +1002,31 @@ def main(argv):
         my_tests()
         return 0
 
+    positional, options = parse_options(argv)
+
     try:
-        router_file_name = argv[1]
+        router_file_name = positional[1]
     except:
         usage()
         return 1
 
+    if "classify" in options:
+        prefix_index = PrefixIndex()
+        for key, item in stream_topology(router_file_name):
+            if key == "routers":
+                router_ip, router_info = item
+                prefix_index.add(router_ip, router_info["netmask"])
+
+        counts = classify_stream(
+            prefix_index, options["classify"], "assign" in options
+        )
+
+        if "assign" not in options:
+            print("Routers and address counts:")
+            for router_ip in sorted(counts.keys()):
+                print(f" {router_ip:>15s}: {counts[router_ip]}")
+        return 0
+
     json_data = read_routers(router_file_name)
 
     routers = json_data["routers"]
@@ -0,0 +1,256 @@
+import math
+import heapq
+
+from array import array
+from dataclasses import dataclass, field
+
+from subnets_and_masks.netfuncs import ipv4_to_value, value_to_ipv4
+
+
+NodeId = int
+
+# Marks "no parent" in a parent array (the source, or an unreached node).
+NO_PARENT = -1
+
+
+def node_key(ip_value: int, prefix_length: int) -> int:
+    """
+    Pack a router IP value and its prefix length into a single integer
+    that is used to intern nodes. The prefix length needs 6 bits (0-32).
+    """
+    return (ip_value << 6) | prefix_length
+
+
+def parse_prefix_length(slash: str) -> int:
+    return int(slash.split("/")[-1])
+
+
+@dataclass
+class CompiledTopology:
+    """
+    A router graph with nodes interned to dense integer IDs and edges
+    stored in compressed-sparse-row form.
+
+    The outgoing edges of node `i` are the entries
+    `targets[offsets[i]:offsets[i + 1]]`, with matching `weights`.
+    `addresses` and `prefix_lengths` hold the router IP value and the
+    slash length of every node, and are enough to rebuild the node name
+    that parse_routers would use ("10.34.98.1/24").
+    """
+
+    addresses: array = field(default_factory=lambda: array("I"))
+    prefix_lengths: array = field(default_factory=lambda: array("B"))
+    offsets: array = field(default_factory=lambda: array("I", [0]))
+    targets: array = field(default_factory=lambda: array("I"))
+    weights: array = field(default_factory=lambda: array("I"))
+    ids: dict[int, NodeId] = field(default_factory=dict)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.addresses)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def node_id(self, ip: str, netmask: str) -> NodeId | None:
+        return self.ids.get(node_key(ipv4_to_value(ip), parse_prefix_length(netmask)))
+
+    def node_id_for_name(self, name: str) -> NodeId | None:
+        ip, _, prefix_length = name.partition("/")
+        return self.node_id(ip, prefix_length)
+
+    def node_name(self, node: NodeId) -> str:
+        return f"{value_to_ipv4(self.addresses[node])}/{self.prefix_lengths[node]}"
+
+    def neighbors(self, node: NodeId):
+        for edge in range(self.offsets[node], self.offsets[node + 1]):
+            yield self.targets[edge], self.weights[edge]
+
+    def nbytes(self) -> int:
+        """
+        Size of the CSR buffers in bytes (the id dict is not included).
+        """
+        buffers = (
+            self.addresses,
+            self.prefix_lengths,
+            self.offsets,
+            self.targets,
+            self.weights,
+        )
+        return sum(len(buffer) * buffer.itemsize for buffer in buffers)
+
+
+class TopologyBuilder:
+    """
+    Compile routers into a CompiledTopology one at a time, so the full
+    routers dict never has to exist (see netfuncs.stream_topology).
+
+    Connections are kept as raw (target key, weight) pairs until
+    finish(), because a connection can name a router that has not been
+    added yet.
+    """
+
+    def __init__(self):
+        self.topology = CompiledTopology()
+
+        self.edge_offsets = array("I", [0])
+        self.target_keys = array("Q")
+        self.edge_weights = array("I")
+
+    def add_router(self, router: str, router_info: dict) -> NodeId:
+        topology = self.topology
+        node = topology.node_count
+
+        ip_value = ipv4_to_value(router)
+        prefix_length = parse_prefix_length(router_info["netmask"])
+
+        topology.ids[node_key(ip_value, prefix_length)] = node
+        topology.addresses.append(ip_value)
+        topology.prefix_lengths.append(prefix_length)
+
+        for connection, connection_info in router_info["connections"].items():
+            self.target_keys.append(
+                node_key(
+                    ipv4_to_value(connection),
+                    parse_prefix_length(connection_info["netmask"]),
+                )
+            )
+            self.edge_weights.append(connection_info["ad"])
+
+        self.edge_offsets.append(len(self.target_keys))
+        return node
+
+    def finish(self) -> CompiledTopology:
+        """
+        Resolve the raw connections to node IDs and build the CSR
+        buffers. Like parse_routers, a connection only becomes an edge
+        if its "ip/netmask" names a router in the topology; connections
+        to anything else can never be relaxed and are dropped.
+        """
+        topology = self.topology
+
+        for node in range(topology.node_count):
+            edges: dict[NodeId, int] = {}
+
+            for edge in range(self.edge_offsets[node], self.edge_offsets[node + 1]):
+                target = topology.ids.get(self.target_keys[edge])
+                if target is None:
+                    continue
+
+                weight = self.edge_weights[edge]
+                edges[target] = min(weight, edges.get(target, weight))
+
+            topology.targets.extend(edges.keys())
+            topology.weights.extend(edges.values())
+            topology.offsets.append(len(topology.targets))
+
+        self.edge_offsets = array("I", [0])
+        self.target_keys = array("Q")
+        self.edge_weights = array("I")
+
+        return topology
+
+
+def compile_topology(routers: dict) -> CompiledTopology:
+    """
+    Build a CompiledTopology from the "routers" section of the JSON.
+    """
+    builder = TopologyBuilder()
+
+    for router, router_info in routers.items():
+        builder.add_router(router, router_info)
+
+    return builder.finish()
+
+
+def csr_search(
+    topology: CompiledTopology,
+    source: NodeId,
+    destination: NodeId | None = None,
+    stats=None,
+) -> tuple[list[float], array]:
+    """
+    Heap Dijkstra over a CompiledTopology. Returns the (distances,
+    parent) arrays indexed by node ID; unreached nodes keep math.inf and
+    NO_PARENT. Stops once destination is settled, if one is given.
+
+    With stats (a dijkstra.RouteStats) the nodes settled, edges relaxed
+    and heap pushes are added to it.
+    """
+    offsets = topology.offsets
+    targets = topology.targets
+    weights = topology.weights
+
+    distances = [math.inf] * topology.node_count
+    parent = array("l", [NO_PARENT]) * topology.node_count
+    settled = bytearray(topology.node_count)
+
+    distances[source] = 0
+    heap: list[tuple[int, NodeId]] = [(0, source)]
+    pushes = 1
+
+    while len(heap) > 0:
+        distance, closest_node = heapq.heappop(heap)
+
+        if settled[closest_node]:
+            continue
+        settled[closest_node] = 1
+
+        if closest_node == destination:
+            break
+
+        for edge in range(offsets[closest_node], offsets[closest_node + 1]):
+            neighbor = targets[edge]
+            if settled[neighbor]:
+                continue
+
+            total_distance = distance + weights[edge]
+            if total_distance < distances[neighbor]:
+                distances[neighbor] = total_distance
+                parent[neighbor] = closest_node
+                heapq.heappush(heap, (total_distance, neighbor))
+                pushes += 1
+
+    if stats is not None:
+        settled_nodes = [node for node, done in enumerate(settled) if done]
+
+        # a destination the search stopped at never had its edges relaxed
+        stats.nodes_settled += len(settled_nodes)
+        stats.edges_relaxed += sum(
+            offsets[node + 1] - offsets[node]
+            for node in settled_nodes
+            if node != destination
+        )
+        stats.heap_pushes += pushes
+
+    return distances, parent
+
+
+def csr_path(parent: array, destination: NodeId) -> list[NodeId]:
+    """
+    Walk a parent array back from destination and return the node IDs,
+    source first. Behaves like dijkstra.reconstruct_path for an
+    unreached destination: the result is just [destination].
+    """
+    path: list[NodeId] = []
+
+    current_node = destination
+    while current_node != NO_PARENT:
+        path.append(current_node)
+        current_node = parent[current_node]
+
+    return list(reversed(path))
+
+
+def reconstruct_csr_path(
+    topology: CompiledTopology, parent: array, destination: NodeId
+) -> list[str]:
+    return [topology.node_name(node) for node in csr_path(parent, destination)]
+
+
+def csr_shortest_path(
+    topology: CompiledTopology, source: NodeId, destination: NodeId
+) -> list[str]:
+    _, parent = csr_search(topology, source, destination)
+    return reconstruct_csr_path(topology, parent, destination)
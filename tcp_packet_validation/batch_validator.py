@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+import time
+import multiprocessing
+from dataclasses import asdict, dataclass, field
+
+from tcp_packet_validator import (
+    CHECKSUM_OFFSET,
+    fast_checksum,
+    parse_options,
+    read_segment,
+)
+
+
+ADDRESSES_PATTERN = re.compile(r"tcp_addrs_(\d+)\.txt")
+
+# How many addr/dat pairs each pool task carries: enough that a task
+# costs much more than sending it, few enough to keep the workers even.
+DEFAULT_TASK_CHUNK = 256
+
+# A pair: (index, addresses file name, data file name)
+Pair = tuple[int, str, str]
+
+
+@dataclass
+class BatchSummary:
+    segments: int = 0
+    passed: int = 0
+    failed: int = 0
+    failing: list[int] = field(default_factory=list)
+    missing: list[int] = field(default_factory=list)  # addrs without a .dat
+    unreadable: list[int] = field(default_factory=list)  # could not be parsed
+    segment_bytes: int = 0
+    seconds: float = 0.0
+    workers: int = 1
+
+    @property
+    def segments_per_second(self) -> float:
+        return self.segments / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return self.segment_bytes / self.seconds / (1 << 20)
+
+    def to_json(self) -> dict:
+        return {
+            **asdict(self),
+            "segments_per_second": round(self.segments_per_second, 1),
+            "mb_per_second": round(self.mb_per_second, 3),
+        }
+
+
+def find_pairs(directory: str) -> tuple[list[Pair], list[int]]:
+    """
+    Every tcp_addrs_<i>.txt in directory with its tcp_data_<i>.dat, by
+    index. Returns the pairs and the indices that have no data file.
+    """
+    pairs = []
+    missing = []
+
+    with os.scandir(directory) as entries:
+        names = {entry.name for entry in entries}
+
+    for name in names:
+        match = ADDRESSES_PATTERN.fullmatch(name)
+        if match is None:
+            continue
+
+        index = int(match.group(1))
+        data_name = f"tcp_data_{match.group(1)}.dat"
+
+        if data_name in names:
+            pairs.append(
+                (
+                    index,
+                    os.path.join(directory, name),
+                    os.path.join(directory, data_name),
+                )
+            )
+        else:
+            missing.append(index)
+
+    pairs.sort()
+    missing.sort()
+    return pairs, missing
+
+
+def validate_pairs(pairs: list[Pair]) -> tuple[int, list[int], list[int], int]:
+    """
+    Pool task: read and check a chunk of pairs. Returns (segments
+    passed, indices that failed, indices that could not be read or
+    parsed, segment bytes), so only counts and the failures go back to
+    the parent, not one result per pair.
+    """
+    passed = 0
+    failing = []
+    unreadable = []
+    segment_bytes = 0
+
+    for index, addresses_filename, tcp_data_filename in pairs:
+        try:
+            segment = read_segment(addresses_filename, tcp_data_filename)
+        except (OSError, ValueError, OverflowError):
+            unreadable.append(index)
+            continue
+
+        data = segment.data
+
+        original_checksum = int.from_bytes(
+            data[CHECKSUM_OFFSET : CHECKSUM_OFFSET + 2], "big"
+        )
+        if fast_checksum(data, segment.addresses) == original_checksum:
+            passed += 1
+        else:
+            failing.append(index)
+
+        segment_bytes += len(data)
+
+    return passed, failing, unreadable, segment_bytes
+
+
+def validate_directory(
+    directory: str,
+    workers: int | None = None,
+    task_chunk: int = DEFAULT_TASK_CHUNK,
+) -> BatchSummary:
+    """
+    Validate every addr/dat pair of a directory, spread over a process
+    pool.
+
+    The pairs are cut into tasks of task_chunk pairs, handed out with
+    imap_unordered so a worker takes the next task as soon as it is
+    done, and every task sends back one small aggregate. The work is
+    mostly reading and summing files, with nothing shared between
+    tasks, so it scales with the workers until the disk is the limit.
+    With one worker, or a single task, no pool is started.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+
+    pairs, missing = find_pairs(directory)
+    summary = BatchSummary(missing=missing)
+
+    tasks = [
+        pairs[offset : offset + task_chunk]
+        for offset in range(0, len(pairs), task_chunk)
+    ]
+
+    summary.workers = max(1, min(workers, len(tasks)))
+
+    if summary.workers == 1:
+        add_results(summary, map(validate_pairs, tasks))
+    else:
+        with multiprocessing.Pool(summary.workers) as pool:
+            add_results(summary, pool.imap_unordered(validate_pairs, tasks))
+
+    summary.failing.sort()
+    summary.unreadable.sort()
+    summary.segments = summary.passed + summary.failed
+    summary.seconds = time.perf_counter() - start
+
+    return summary
+
+
+def add_results(summary: BatchSummary, results):
+    for passed, failing, unreadable, segment_bytes in results:
+        summary.passed += passed
+        summary.failed += len(failing)
+        summary.failing.extend(failing)
+        summary.unreadable.extend(unreadable)
+        summary.segment_bytes += segment_bytes
+
+
+def print_summary(summary: BatchSummary):
+    print(
+        f"PASS {summary.passed} FAIL {summary.failed} "
+        f"({summary.segments} segments, {len(summary.missing)} missing data, "
+        f"{len(summary.unreadable)} unreadable)"
+    )
+    if summary.failed > 0:
+        print(f"failing: {' '.join(str(index) for index in summary.failing)}")
+    if len(summary.unreadable) > 0:
+        print(f"unreadable: {' '.join(str(index) for index in summary.unreadable)}")
+    print(
+        f"{summary.seconds:.3f} s, {summary.segments_per_second:.0f} segments/s, "
+        f"{summary.mb_per_second:.2f} MB/s on {summary.workers} worker(s)"
+    )
+
+
+def usage():
+    print(
+        "usage: batch_validator.py directory [--workers=N] "
+        f"[--chunk={DEFAULT_TASK_CHUNK}] [--json]",
+        file=sys.stderr,
+    )
+
+
+def main(argv):
+    positional, options = parse_options(argv)
+
+    try:
+        (_, directory) = positional
+        workers = int(options["workers"]) if "workers" in options else None
+        task_chunk = int(options.get("chunk", DEFAULT_TASK_CHUNK))
+    except ValueError:
+        usage()
+        return 1
+
+    if (workers is not None and workers < 1) or task_chunk < 1:
+        usage()
+        return 1
+
+    try:
+        summary = validate_directory(directory, workers, task_chunk)
+    except OSError as error:
+        print(f"{directory}: {error}", file=sys.stderr)
+        return 1
+
+    if "json" in options:
+        print(json.dumps(summary.to_json(), indent=4))
+    else:
+        print_summary(summary)
+
+    return 0 if summary.failed == 0 and len(summary.unreadable) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
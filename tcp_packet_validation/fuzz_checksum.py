@@ -0,0 +1,139 @@
+import sys
+import random
+
+from tcp_packet_validator import (
+    CHECKSUM_OFFSET,
+    AddressInfo,
+    compute_checksum,
+    parse_options,
+    rewrite_field,
+    update_checksum_for_addresses,
+)
+
+
+DEFAULT_ROUNDS = 30000
+
+TCP_MIN_HEADER = 20
+TCP_MAX_HEADER = 60
+MAX_PAYLOAD = 1500
+
+# Header fields a NAT or rewrite tool changes: (offset, length). The
+# flags byte and the data offset byte are odd-sized on purpose.
+HEADER_FIELDS = (
+    (0, 2),  # source port
+    (2, 2),  # destination port
+    (4, 4),  # sequence number
+    (8, 4),  # acknowledgment number
+    (12, 1),  # data offset
+    (13, 1),  # flags
+    (14, 2),  # window
+    (18, 2),  # urgent pointer
+)
+
+
+def random_addresses(rng: random.Random) -> AddressInfo:
+    return AddressInfo(rng.randbytes(4), rng.randbytes(4))
+
+
+def random_segment(rng: random.Random, addresses: AddressInfo) -> bytearray:
+    """
+    A random header and payload, odd lengths included, carrying the
+    checksum compute_checksum gives it.
+    """
+    header_length = rng.randrange(TCP_MIN_HEADER, TCP_MAX_HEADER + 1, 4)
+    segment = bytearray(rng.randbytes(header_length + rng.randrange(MAX_PAYLOAD)))
+
+    checksum = compute_checksum(bytes(segment), addresses)
+    segment[CHECKSUM_OFFSET : CHECKSUM_OFFSET + 2] = checksum.to_bytes(2, "big")
+    return segment
+
+
+def random_field(rng: random.Random, segment: bytearray) -> tuple[int, int]:
+    """
+    A header field, or any run of payload bytes, as (offset, length).
+    """
+    if rng.random() < 0.5 or len(segment) == TCP_MIN_HEADER:
+        return rng.choice(HEADER_FIELDS)
+
+    offset = rng.randrange(TCP_MIN_HEADER, len(segment))
+    return offset, rng.randrange(1, min(16, len(segment) - offset) + 1)
+
+
+def fuzz_round(rng: random.Random) -> str | None:
+    """
+    One random rewrite, checked against a full compute_checksum. Returns
+    a description of the mismatch, or None.
+    """
+    addresses = random_addresses(rng)
+    segment = random_segment(rng, addresses)
+    checksum = int.from_bytes(segment[CHECKSUM_OFFSET : CHECKSUM_OFFSET + 2], "big")
+
+    if rng.random() < 0.5:
+        offset, length = random_field(rng, segment)
+        rewrite_field(segment, offset, rng.randbytes(length))
+
+        updated = int.from_bytes(segment[CHECKSUM_OFFSET : CHECKSUM_OFFSET + 2], "big")
+        expected = compute_checksum(bytes(segment), addresses)
+        what = f"rewrite_field at {offset}, {length} byte(s)"
+    else:
+        new_addresses = random_addresses(rng)
+
+        updated = update_checksum_for_addresses(checksum, addresses, new_addresses)
+        expected = compute_checksum(bytes(segment), new_addresses)
+        what = "update_checksum_for_addresses"
+
+    if updated == expected:
+        return None
+
+    return (
+        f"{what} on a {len(segment)} byte segment: "
+        f"{updated:04x}, recomputed {expected:04x}"
+    )
+
+
+def fuzz(rounds: int, seed: int | None = None) -> list[str]:
+    """
+    Run rounds random rewrites and return every mismatch found.
+    """
+    rng = random.Random(seed)
+
+    failures = []
+    for _ in range(rounds):
+        failure = fuzz_round(rng)
+        if failure is not None:
+            failures.append(failure)
+
+    return failures
+
+
+def usage():
+    print(
+        f"usage: fuzz_checksum.py [--rounds={DEFAULT_ROUNDS}] [--seed=N]",
+        file=sys.stderr,
+    )
+
+
+def main(argv):
+    positional, options = parse_options(argv)
+    if len(positional) != 1:
+        usage()
+        return 1
+
+    try:
+        rounds = int(options.get("rounds", DEFAULT_ROUNDS))
+        seed = int(options["seed"]) if "seed" in options else None
+    except ValueError:
+        usage()
+        return 1
+
+    failures = fuzz(rounds, seed)
+
+    for failure in failures:
+        print(failure)
+    print(f"{rounds} rounds, {len(failures)} mismatches")
+
+    return 0 if len(failures) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
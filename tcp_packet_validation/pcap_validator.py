@@ -0,0 +1,378 @@
+import sys
+import mmap
+import socket
+import struct
+import typing
+from dataclasses import dataclass, field
+
+from tcp_packet_validator import (
+    CHECKSUM_OFFSET,
+    AddressInfo,
+    fast_checksum,
+    parse_options,
+)
+
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": "<",  # microsecond timestamps
+    b"\x4d\x3c\xb2\xa1": "<",  # nanosecond timestamps
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\xa1\xb2\x3c\x4d": ">",
+}
+PCAP_HEADER_SIZE = 24
+PCAP_RECORD_SIZE = 16
+
+# pcapng block types (the section header type reads the same both ways)
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 1
+PCAPNG_SIMPLE_PACKET = 3
+PCAPNG_ENHANCED_PACKET = 6
+PCAPNG_LITTLE_ENDIAN_MAGIC = b"\x4d\x3c\x2b\x1a"
+
+# Smallest length of each block type parsed: the block type and length,
+# the fixed fields, and the trailing length.
+PCAPNG_FIXED_LENGTHS = {
+    PCAPNG_INTERFACE_DESCRIPTION: 20,
+    PCAPNG_SIMPLE_PACKET: 16,
+    PCAPNG_ENHANCED_PACKET: 32,
+}
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLANS = (0x8100, 0x88A8)
+
+# version/IHL, total length, flags/fragment offset, protocol, source and
+# destination address
+IPV4_HEADER = struct.Struct("!BxH2xHxB2x4s4s")
+
+PROTOCOL_TCP = 6
+TCP_MIN_HEADER = 20
+
+# Pages of the mapping that were validated are handed back to the OS
+# every this many bytes, so resident memory stays flat on large files.
+DROP_BEHIND_SIZE = 64 << 20
+
+# Outcome of looking for a TCP segment in a captured frame.
+SEGMENT = "segment"
+SKIPPED = "skipped"  # not IPv4/TCP, or a fragment
+TRUNCATED = "truncated"  # cut short by the snaplen or the end of the file
+
+# A flow: source address + port, destination address + port, as the 12
+# raw bytes they are on the wire.
+FlowKey = bytes
+
+
+@dataclass
+class FlowCounts:
+    passed: int = 0
+    failed: int = 0
+
+
+@dataclass
+class CaptureReport:
+    flows: dict[FlowKey, FlowCounts] = field(default_factory=dict)
+    passed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    truncated: int = 0
+    segment_bytes: int = 0
+
+
+def format_flow(key: FlowKey) -> str:
+    src = socket.inet_ntoa(key[0:4])
+    dst = socket.inet_ntoa(key[4:8])
+    src_port = int.from_bytes(key[8:10], "big")
+    dst_port = int.from_bytes(key[10:12], "big")
+    return f"{src}:{src_port} -> {dst}:{dst_port}"
+
+
+def drop_behind(mapping: mmap.mmap | None, start: int, end: int) -> int:
+    """
+    Every DROP_BEHIND_SIZE bytes, let the OS drop the pages of the
+    mapping between start (page aligned) and end, which have been read
+    and will not be again. Returns where the next drop starts.
+    """
+    if mapping is None or end - start < DROP_BEHIND_SIZE:
+        return start
+
+    end -= end % mmap.PAGESIZE
+    if hasattr(mmap, "MADV_DONTNEED"):
+        mapping.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    return end
+
+
+def iter_pcap_packets(
+    view: memoryview, mapping: mmap.mmap | None = None
+) -> typing.Iterator[tuple[int | None, memoryview | None]]:
+    """
+    Yield (link type, frame) for every record of a classic pcap file,
+    the frames being slices of view. When view is over mapping, the
+    pages left behind are dropped as it goes (see drop_behind).
+
+    A file that ends inside a record yields (link type, None) for it and
+    stops there.
+    """
+    if len(view) < PCAP_HEADER_SIZE:
+        raise ValueError("truncated pcap file header")
+
+    endian = PCAP_MAGICS[bytes(view[:4])]
+    linktype = struct.unpack_from(endian + "I", view, 20)[0]
+    record = struct.Struct(endian + "IIII")
+
+    offset = PCAP_HEADER_SIZE
+    dropped = 0
+    while offset + PCAP_RECORD_SIZE <= len(view):
+        _, _, captured, _ = record.unpack_from(view, offset)
+        offset += PCAP_RECORD_SIZE
+
+        if offset + captured > len(view):
+            yield linktype, None
+            break
+
+        yield linktype, view[offset : offset + captured]
+        offset += captured
+        dropped = drop_behind(mapping, dropped, offset)
+
+
+def iter_pcapng_packets(
+    view: memoryview, mapping: mmap.mmap | None = None
+) -> typing.Iterator[tuple[int | None, memoryview | None]]:
+    """
+    Yield (link type, frame) for every enhanced or simple packet block of
+    a pcapng file, like iter_pcap_packets. Every section header sets the
+    byte order and starts a new list of interfaces; other blocks are
+    skipped.
+
+    A packet block naming an interface the section did not describe
+    yields None for the link type. A file that ends inside a packet
+    block yields (link type, None) for it, and parsing stops at the
+    first block that does not fit in the file.
+    """
+    endian = "<"
+    linktypes: list[int] = []
+
+    offset = 0
+    dropped = 0
+    while offset + 12 <= len(view):
+        block_type = struct.unpack_from(endian + "I", view, offset)[0]
+
+        if block_type == PCAPNG_SECTION_HEADER:
+            byte_order_magic = bytes(view[offset + 8 : offset + 12])
+            endian = "<" if byte_order_magic == PCAPNG_LITTLE_ENDIAN_MAGIC else ">"
+            linktypes = []
+
+        block_length = struct.unpack_from(endian + "I", view, offset + 4)[0]
+        if block_length < 12:
+            break
+
+        body = offset + 8
+        fixed_length = PCAPNG_FIXED_LENGTHS.get(block_type, 0)
+
+        if offset + block_length > len(view) or block_length < fixed_length:
+            if block_type in (PCAPNG_ENHANCED_PACKET, PCAPNG_SIMPLE_PACKET):
+                yield None, None
+            break
+
+        if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+            linktypes.append(struct.unpack_from(endian + "H", view, body)[0])
+
+        elif block_type == PCAPNG_ENHANCED_PACKET:
+            interface, _, _, captured, _ = struct.unpack_from(
+                endian + "IIIII", view, body
+            )
+            linktype = linktypes[interface] if interface < len(linktypes) else None
+            captured = min(captured, block_length - fixed_length)
+            yield linktype, view[body + 20 : body + 20 + captured]
+
+        elif block_type == PCAPNG_SIMPLE_PACKET:
+            original = struct.unpack_from(endian + "I", view, body)[0]
+            linktype = linktypes[0] if len(linktypes) > 0 else None
+            captured = min(original, block_length - fixed_length)
+            yield linktype, view[body + 4 : body + 4 + captured]
+
+        offset += block_length
+        dropped = drop_behind(mapping, dropped, offset)
+
+
+def iter_packets(
+    view: memoryview, mapping: mmap.mmap | None = None
+) -> typing.Iterator[tuple[int | None, memoryview | None]]:
+    if bytes(view[:4]) in PCAP_MAGICS:
+        return iter_pcap_packets(view, mapping)
+
+    if len(view) >= 4 and struct.unpack_from("<I", view, 0)[0] == PCAPNG_SECTION_HEADER:
+        return iter_pcapng_packets(view, mapping)
+
+    raise ValueError("not a pcap or pcapng file")
+
+
+def ipv4_packet(linktype: int | None, frame: memoryview) -> memoryview | None:
+    """
+    The IPv4 packet inside a captured frame, or None if it carries
+    something else or its link type is unknown.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype = int.from_bytes(frame[offset : offset + 2], "big")
+        while ethertype in ETHERTYPE_VLANS:
+            offset += 4
+            ethertype = int.from_bytes(frame[offset : offset + 2], "big")
+        offset += 2
+    elif linktype == LINKTYPE_LINUX_SLL:
+        offset = 16
+        ethertype = int.from_bytes(frame[14:16], "big")
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        offset = 0
+        ethertype = ETHERTYPE_IPV4
+    else:
+        return None
+
+    if ethertype != ETHERTYPE_IPV4 or len(frame) < offset + 20:
+        return None
+    if frame[offset] >> 4 != 4:
+        return None
+
+    return frame[offset:]
+
+
+def tcp_segment(
+    ip: memoryview,
+) -> tuple[str, AddressInfo | None, memoryview | None]:
+    """
+    Find the TCP segment of an IPv4 packet, bounded by the IP total
+    length so Ethernet padding is left out. Returns (SEGMENT, addresses,
+    segment), or (SKIPPED | TRUNCATED, None, None).
+    """
+    version_ihl, total_length, fragment, protocol, src, dst = (
+        IPV4_HEADER.unpack_from(ip)
+    )
+    header_length = (version_ihl & 0x0F) * 4
+
+    # a set MF flag or a fragment offset: not a whole segment
+    if protocol != PROTOCOL_TCP or fragment & 0x3FFF != 0:
+        return SKIPPED, None, None
+    if header_length < 20 or total_length < header_length + TCP_MIN_HEADER:
+        return SKIPPED, None, None
+    if len(ip) < total_length:
+        return TRUNCATED, None, None
+
+    return SEGMENT, AddressInfo(src, dst), ip[header_length:total_length]
+
+
+def validate_capture(file_name: str) -> CaptureReport:
+    """
+    Validate the checksum of every TCP segment in a pcap or pcapng file
+    in one streaming pass.
+
+    The file is mapped with mmap and every header is parsed in place:
+    the frames, packets and segments are memoryview slices of the
+    mapping, and the pages already read are dropped every
+    DROP_BEHIND_SIZE bytes, so memory use stays flat whatever the file
+    size (only the per-flow counters grow, with the number of flows).
+    """
+    report = CaptureReport()
+
+    with open(file_name, "rb") as fp:
+        if fp.seek(0, 2) == 0:
+            return report
+
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            view = memoryview(mapping)
+            try:
+                validate_packets(iter_packets(view, mapping), report)
+            finally:
+                view.release()
+
+    return report
+
+
+def validate_packets(
+    packets: typing.Iterable[tuple[int | None, memoryview | None]],
+    report: CaptureReport,
+):
+    for linktype, frame in packets:
+        if frame is None:
+            report.truncated += 1
+            continue
+
+        ip = ipv4_packet(linktype, frame)
+        if ip is None:
+            report.skipped += 1
+            continue
+
+        status, addresses, segment = tcp_segment(ip)
+        if status == SKIPPED:
+            report.skipped += 1
+            continue
+        if status == TRUNCATED:
+            report.truncated += 1
+            continue
+
+        original_checksum = int.from_bytes(
+            segment[CHECKSUM_OFFSET : CHECKSUM_OFFSET + 2], "big"
+        )
+        passed = fast_checksum(segment, addresses) == original_checksum
+
+        key = addresses.adress_from + addresses.adress_to + bytes(segment[:4])
+        counts = report.flows.get(key)
+        if counts is None:
+            counts = report.flows[key] = FlowCounts()
+
+        if passed:
+            counts.passed += 1
+            report.passed += 1
+        else:
+            counts.failed += 1
+            report.failed += 1
+
+        report.segment_bytes += len(segment)
+
+
+def print_report(report: CaptureReport, show_flows: bool):
+    if show_flows:
+        print("Flows:")
+        for key in sorted(report.flows.keys()):
+            counts = report.flows[key]
+            print(
+                f" {format_flow(key):<47s} PASS {counts.passed} FAIL {counts.failed}"
+            )
+        print()
+
+    print(
+        f"PASS {report.passed} FAIL {report.failed} "
+        f"({len(report.flows)} flows, {report.skipped} skipped, "
+        f"{report.truncated} truncated)"
+    )
+
+
+def usage():
+    print("usage: pcap_validator.py capture.pcap [--flows]", file=sys.stderr)
+
+
+def main(argv):
+    positional, options = parse_options(argv)
+
+    try:
+        (_, file_name) = positional
+    except ValueError:
+        usage()
+        return 1
+
+    try:
+        report = validate_capture(file_name)
+    except (OSError, ValueError) as error:
+        print(f"{file_name}: {error}", file=sys.stderr)
+        return 1
+
+    print_report(report, "flows" in options)
+
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,262 @@
+import struct
+import typing
+from array import array
+from dataclasses import dataclass, field
+
+from tcp_packet_validator import readData
+
+
+# source port, destination port, sequence number, acknowledgment number,
+# data offset (high nibble), flags, window, checksum, urgent pointer
+TCP_HEADER = struct.Struct("!HHIIBBHHH")
+TCP_MIN_HEADER = TCP_HEADER.size
+
+U16 = struct.Struct("!H")
+U32 = struct.Struct("!I")
+
+# Flag bits as TcpHeader.flags has them (NS is the low bit of byte 12).
+FLAG_NAMES = ("FIN", "SYN", "RST", "PSH", "ACK", "URG", "ECE", "CWR", "NS")
+
+OPTION_END = 0
+OPTION_NOP = 1
+
+# An option: (kind, value)
+TcpOption = tuple[int, memoryview]
+
+
+class TcpHeader:
+    """
+    Lazy view of a TCP header inside a larger buffer (a capture, a
+    receive buffer, a .dat file): it keeps the buffer, the offset of the
+    segment and its length, and decodes a field with struct only when it
+    is read. Nothing is copied, and with __slots__ a header costs one
+    small object (56 bytes on 64-bit CPython) whatever the segment
+    size, the buffer being shared.
+    """
+
+    __slots__ = ("buffer", "offset", "length")
+
+    def __init__(
+        self,
+        buffer: typing.ByteString,
+        offset: int = 0,
+        length: int | None = None,
+    ):
+        if length is None:
+            length = len(buffer) - offset
+        if length < TCP_MIN_HEADER or offset + length > len(buffer):
+            raise ValueError("buffer too short for a TCP header")
+
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+
+    @property
+    def src_port(self) -> int:
+        return U16.unpack_from(self.buffer, self.offset)[0]
+
+    @property
+    def dst_port(self) -> int:
+        return U16.unpack_from(self.buffer, self.offset + 2)[0]
+
+    @property
+    def seq(self) -> int:
+        return U32.unpack_from(self.buffer, self.offset + 4)[0]
+
+    @property
+    def ack(self) -> int:
+        return U32.unpack_from(self.buffer, self.offset + 8)[0]
+
+    @property
+    def data_offset(self) -> int:
+        """
+        Header length in bytes, options included.
+        """
+        return (self.buffer[self.offset + 12] >> 4) * 4
+
+    @property
+    def flags(self) -> int:
+        return self.buffer[self.offset + 13] | (self.buffer[self.offset + 12] & 1) << 8
+
+    @property
+    def window(self) -> int:
+        return U16.unpack_from(self.buffer, self.offset + 14)[0]
+
+    @property
+    def checksum(self) -> int:
+        return U16.unpack_from(self.buffer, self.offset + 16)[0]
+
+    @property
+    def urgent_pointer(self) -> int:
+        return U16.unpack_from(self.buffer, self.offset + 18)[0]
+
+    @property
+    def options(self) -> memoryview:
+        """
+        The raw options, cut short if the data offset runs past the
+        segment.
+        """
+        end = min(self.data_offset, self.length)
+        return memoryview(self.buffer)[self.offset + TCP_MIN_HEADER : self.offset + end]
+
+    @property
+    def payload(self) -> memoryview:
+        start = min(max(self.data_offset, TCP_MIN_HEADER), self.length)
+        return memoryview(self.buffer)[self.offset + start : self.offset + self.length]
+
+    def flag_names(self) -> list[str]:
+        flags = self.flags
+        return [name for bit, name in enumerate(FLAG_NAMES) if flags & (1 << bit)]
+
+    def iter_options(self) -> typing.Iterator[TcpOption]:
+        """
+        Yield (kind, value) for every option, NOPs left out, up to the end
+        of option list or a malformed length.
+        """
+        options = self.options
+        offset = 0
+
+        while offset < len(options):
+            kind = options[offset]
+            if kind == OPTION_END:
+                break
+            if kind == OPTION_NOP:
+                offset += 1
+                continue
+
+            if offset + 1 >= len(options):
+                break
+            option_length = options[offset + 1]
+            if option_length < 2 or offset + option_length > len(options):
+                break
+
+            yield kind, options[offset + 2 : offset + option_length]
+            offset += option_length
+
+    def unpack(self) -> tuple[int, ...]:
+        """
+        Every fixed field at once, in TCP_HEADER order, for when most of
+        them are needed.
+        """
+        return TCP_HEADER.unpack_from(self.buffer, self.offset)
+
+    def __repr__(self) -> str:
+        return (
+            f"TcpHeader({self.src_port} -> {self.dst_port}, seq={self.seq}, "
+            f"ack={self.ack}, flags={'|'.join(self.flag_names())}, "
+            f"window={self.window}, length={self.length})"
+        )
+
+
+@dataclass
+class TcpHeaderColumns:
+    """
+    Columnar form of many TCP headers: one array per field, the i-th
+    entry of every array belonging to the i-th segment. 23 bytes
+    per segment, and bulk statistics run over flat arrays instead of
+    objects.
+    """
+
+    src_ports: array = field(default_factory=lambda: array("H"))
+    dst_ports: array = field(default_factory=lambda: array("H"))
+    seqs: array = field(default_factory=lambda: array("I"))
+    acks: array = field(default_factory=lambda: array("I"))
+    data_offsets: array = field(default_factory=lambda: array("B"))
+    flags: array = field(default_factory=lambda: array("H"))
+    windows: array = field(default_factory=lambda: array("H"))
+    checksums: array = field(default_factory=lambda: array("H"))
+    lengths: array = field(default_factory=lambda: array("I"))
+
+    def __len__(self) -> int:
+        return len(self.src_ports)
+
+    def append(
+        self, buffer: typing.ByteString, offset: int = 0, length: int | None = None
+    ):
+        if length is None:
+            length = len(buffer) - offset
+        if length < TCP_MIN_HEADER or offset + length > len(buffer):
+            raise ValueError("buffer too short for a TCP header")
+
+        src_port, dst_port, seq, ack, offset_byte, flags, window, checksum, _ = (
+            TCP_HEADER.unpack_from(buffer, offset)
+        )
+
+        self.src_ports.append(src_port)
+        self.dst_ports.append(dst_port)
+        self.seqs.append(seq)
+        self.acks.append(ack)
+        # clamped like TcpHeader.payload, so payload_bytes never counts
+        # a header longer than its segment
+        data_offset = min(max((offset_byte >> 4) * 4, TCP_MIN_HEADER), length)
+        self.data_offsets.append(data_offset)
+        self.flags.append(flags | (offset_byte & 1) << 8)
+        self.windows.append(window)
+        self.checksums.append(checksum)
+        self.lengths.append(length)
+
+    @classmethod
+    def from_segments(
+        cls, segments: typing.Iterable[typing.ByteString]
+    ) -> "TcpHeaderColumns":
+        columns = cls()
+        for segment in segments:
+            columns.append(segment)
+        return columns
+
+    def header(self, index: int) -> tuple[int, ...]:
+        return (
+            self.src_ports[index],
+            self.dst_ports[index],
+            self.seqs[index],
+            self.acks[index],
+            self.data_offsets[index],
+            self.flags[index],
+            self.windows[index],
+            self.checksums[index],
+            self.lengths[index],
+        )
+
+    def flag_counts(self) -> dict[str, int]:
+        """
+        How many segments have each flag set.
+        """
+        by_value: dict[int, int] = {}
+        for flags in self.flags:
+            by_value[flags] = by_value.get(flags, 0) + 1
+
+        counts = {name: 0 for name in FLAG_NAMES}
+        for flags, count in by_value.items():
+            for bit, name in enumerate(FLAG_NAMES):
+                if flags & (1 << bit):
+                    counts[name] += count
+
+        return counts
+
+    def port_counts(self) -> dict[int, int]:
+        """
+        How many segments go to each destination port.
+        """
+        counts: dict[int, int] = {}
+        for port in self.dst_ports:
+            counts[port] = counts.get(port, 0) + 1
+        return counts
+
+    def payload_bytes(self) -> int:
+        return sum(self.lengths) - sum(self.data_offsets)
+
+
+if __name__ == "__main__":
+    data = readData()
+
+    for i, example in enumerate(data):
+        header = TcpHeader(example.data)
+        print(f"{i} {header}")
+        for kind, value in header.iter_options():
+            print(f"    option {kind}: {value.hex()}")
+
+    columns = TcpHeaderColumns.from_segments(example.data for example in data)
+    print()
+    print(f"flags: {columns.flag_counts()}")
+    print(f"destination ports: {columns.port_counts()}")
+    print(f"payload bytes: {columns.payload_bytes()}")